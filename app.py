@@ -8,6 +8,10 @@ from components import (
     get_landing_styles,
     get_image_base64
 )
+import precalentamiento
+
+# Los tableros se precalientan en segundo plano mientras se muestra la portada
+precalentamiento.iniciar()
 
 # Inicializar página
 init_page("Sistema Presupuestal", initial_sidebar_state="collapsed")
@@ -0,0 +1,114 @@
+"""
+Script para comparar la velocidad de los motores de lectura de Excel
+Genera versiones ampliadas del archivo de programación anual de ejemplo (repitiendo
+sus filas de datos) y mide cuánto tarda cada motor en leerlas y clasificarlas
+
+Uso:
+    python benchmark_lectores_excel.py --factores 1 10 50 --motores openpyxl calamine
+"""
+
+import argparse
+import glob
+import os
+import tempfile
+import time
+import openpyxl
+import xlsxwriter
+from lectores_excel import contar_filas_excel, iterar_bloques_excel, motores_disponibles
+
+# database.py (importado por db_operations) crea su engine al importarse; el benchmark no usa la BD
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(tempfile.gettempdir(), 'benchmark_lectores_excel.db')}")
+
+from db_operations import _parsear_bloques
+
+FILAS_OMITIDAS = 4
+
+def _archivo_ejemplo():
+    """Busca el archivo de programación anual incluido en attached_assets"""
+    archivos = sorted(glob.glob(os.path.join(
+        os.path.dirname(os.path.abspath(__file__)),
+        'attached_assets', 'programacion_anuales_especifica_*.xlsx'
+    )))
+    if not archivos:
+        raise FileNotFoundError("No se encontró attached_assets/programacion_anuales_especifica_*.xlsx")
+    return archivos[0]
+
+def crear_archivo_ampliado(origen: str, factor: int, destino: str):
+    """
+    Escribe en destino el archivo origen con sus filas de datos repetidas factor veces
+
+    Las filas de título y el encabezado se copian una sola vez, así el resultado
+    conserva el formato que espera el importador.
+    """
+    libro = openpyxl.load_workbook(origen, read_only=True, data_only=True)
+    try:
+        filas = list(libro.worksheets[0].iter_rows(values_only=True))
+    finally:
+        libro.close()
+
+    cabecera, datos = filas[:FILAS_OMITIDAS + 1], filas[FILAS_OMITIDAS + 1:]
+
+    workbook = xlsxwriter.Workbook(destino, {'constant_memory': True})
+    worksheet = workbook.add_worksheet('Programacion')
+    numero_fila = 0
+    for fila in cabecera + datos * factor:
+        for columna, valor in enumerate(fila):
+            if valor is not None:
+                worksheet.write(numero_fila, columna, valor)
+        numero_fila += 1
+    workbook.close()
+    return numero_fila
+
+def medir_lectura(archivo: str, motor: str, parsear: bool = True):
+    """
+    Lee el archivo completo con el motor indicado
+
+    Returns:
+        Tuple (filas leídas, segundos)
+    """
+    inicio = time.perf_counter()
+    contar_filas_excel(archivo, filas_omitidas=FILAS_OMITIDAS, motor=motor)
+    bloques = iterar_bloques_excel(archivo, filas_omitidas=FILAS_OMITIDAS, motor=motor)
+    filas = 0
+    if parsear:
+        for _, _, _, filas_leidas in _parsear_bloques(bloques):
+            filas += filas_leidas
+    else:
+        for bloque in bloques:
+            filas += len(bloque)
+    return filas, time.perf_counter() - inicio
+
+def ejecutar_benchmark(factores, motores, repeticiones: int = 3, parsear: bool = True):
+    """Mide cada motor sobre cada tamaño de archivo e imprime una tabla de resultados"""
+    origen = _archivo_ejemplo()
+    print(f"Archivo base: {os.path.basename(origen)}")
+    print(f"Motores: {', '.join(motores)}  |  repeticiones: {repeticiones}  |  parseo: {'sí' if parsear else 'no'}\n")
+    print(f"{'Factor':>7} {'Filas':>10} {'Motor':>10} {'Mejor (s)':>10} {'Filas/s':>12}")
+
+    with tempfile.TemporaryDirectory() as directorio:
+        for factor in factores:
+            archivo = os.path.join(directorio, f'programacion_x{factor}.xlsx')
+            crear_archivo_ampliado(origen, factor, archivo)
+
+            for motor in motores:
+                tiempos = []
+                for _ in range(repeticiones):
+                    filas, segundos = medir_lectura(archivo, motor, parsear)
+                    tiempos.append(segundos)
+                mejor = min(tiempos)
+                print(f"{factor:>7} {filas:>10,} {motor:>10} {mejor:>10.3f} {filas / mejor:>12,.0f}")
+
+if __name__ == "__main__":
+    disponibles = motores_disponibles()
+
+    parser = argparse.ArgumentParser(description="Compara los motores de lectura de Excel")
+    parser.add_argument('--factores', type=int, nargs='+', default=[1, 10, 50],
+                        help="Veces que se repiten las filas de datos del archivo de ejemplo")
+    parser.add_argument('--motores', nargs='+', default=disponibles, choices=disponibles,
+                        help="Motores a comparar (por defecto todos los instalados)")
+    parser.add_argument('--repeticiones', type=int, default=3)
+    parser.add_argument('--sin-parseo', action='store_true',
+                        help="Mide solo la lectura, sin clasificar las filas")
+    args = parser.parse_args()
+
+    ejecutar_benchmark(args.factores, args.motores, args.repeticiones, not args.sin_parseo)
@@ -0,0 +1,157 @@
+"""
+Cache local de archivos cargados
+Cada archivo subido se identifica por el SHA-256 de su contenido; el resultado de
+parsearlo se guarda como Parquet para que una nueva carga del mismo archivo vaya
+directo a la escritura en la BD sin volver a leer el Excel. Cuando el cache supera
+su tamaño máximo se eliminan las entradas usadas hace más tiempo.
+"""
+import hashlib
+import os
+import shutil
+import time
+import uuid
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+DIRECTORIO_CACHE = os.getenv(
+    'CACHE_CARGAS_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'cargas')
+)
+TAMAÑO_MAXIMO_CACHE = int(os.getenv('CACHE_CARGAS_MB', '512')) * 1024 * 1024
+
+def clave_cache(tipo: str, contenido: bytes) -> str:
+    """Clave de una entrada: tipo de archivo (con la versión del parser) y SHA-256 del contenido"""
+    return f"{tipo}-{hashlib.sha256(contenido).hexdigest()}"
+
+def _ruta_entrada(clave: str) -> str:
+    return os.path.join(DIRECTORIO_CACHE, clave)
+
+def buscar_en_cache(clave: str):
+    """
+    Busca una entrada y la marca como usada recién
+
+    Returns:
+        Ruta de la entrada o None si el archivo no está en cache
+    """
+    ruta = _ruta_entrada(clave)
+    if not os.path.isdir(ruta):
+        return None
+    try:
+        os.utime(ruta)
+    except OSError:
+        # La entrada pudo ser desalojada por otro proceso
+        return None
+    return ruta
+
+def iterar_tabla_cache(ruta: str, nombre: str, tamaño_bloque: int):
+    """Recorre una tabla de una entrada en DataFrames de a lo más tamaño_bloque filas"""
+    archivo = os.path.join(ruta, f"{nombre}.parquet")
+    if not os.path.exists(archivo):
+        return
+    for lote in pq.ParquetFile(archivo).iter_batches(batch_size=tamaño_bloque):
+        yield lote.to_pandas()
+
+def contar_filas_cache(ruta: str, nombre: str) -> int:
+    """Filas de una tabla de una entrada, según los metadatos del Parquet"""
+    archivo = os.path.join(ruta, f"{nombre}.parquet")
+    return pq.ParquetFile(archivo).metadata.num_rows if os.path.exists(archivo) else 0
+
+def leer_tabla_cache(ruta: str, nombre: str):
+    """Lee completa una tabla de una entrada (None si la entrada no la tiene)"""
+    archivo = os.path.join(ruta, f"{nombre}.parquet")
+    if not os.path.exists(archivo):
+        return None
+    return pq.read_table(archivo).to_pandas()
+
+class EscritorCache:
+    """
+    Escribe una entrada por partes, a medida que se parsean los bloques del archivo
+
+    Las tablas se escriben en un directorio temporal que recién con confirmar() pasa
+    a ser la entrada, así una carga interrumpida no deja entradas a medias.
+    """
+
+    def __init__(self, clave: str):
+        self.clave = clave
+        self.ruta_temporal = os.path.join(DIRECTORIO_CACHE, f".tmp-{uuid.uuid4().hex}")
+        self._escritores = {}
+        os.makedirs(self.ruta_temporal, exist_ok=True)
+
+    def agregar(self, nombre: str, df):
+        """Agrega las filas de df a la tabla nombre"""
+        escritor = self._escritores.get(nombre)
+        if escritor is None:
+            tabla = pa.Table.from_pandas(df, preserve_index=False)
+            # Una columna sin valores en el primer bloque se declara como texto
+            esquema = pa.schema([
+                campo.with_type(pa.string()) if pa.types.is_null(campo.type) else campo
+                for campo in tabla.schema
+            ]).remove_metadata()
+            escritor = pq.ParquetWriter(os.path.join(self.ruta_temporal, f"{nombre}.parquet"), esquema)
+            self._escritores[nombre] = escritor
+        escritor.write_table(pa.Table.from_pandas(df, schema=escritor.schema, preserve_index=False))
+
+    def _cerrar(self):
+        for escritor in self._escritores.values():
+            escritor.close()
+        self._escritores = {}
+
+    def confirmar(self):
+        """Publica la entrada y desaloja las más antiguas si el cache quedó muy grande"""
+        self._cerrar()
+        destino = _ruta_entrada(self.clave)
+        try:
+            os.replace(self.ruta_temporal, destino)
+        except OSError:
+            # Otro proceso publicó la misma entrada primero
+            shutil.rmtree(self.ruta_temporal, ignore_errors=True)
+        desalojar_cache()
+
+    def descartar(self):
+        """Elimina lo escrito sin publicar la entrada"""
+        self._cerrar()
+        shutil.rmtree(self.ruta_temporal, ignore_errors=True)
+
+def _tamaño_directorio(ruta: str) -> int:
+    total = 0
+    for raiz, _, archivos in os.walk(ruta):
+        for archivo in archivos:
+            try:
+                total += os.path.getsize(os.path.join(raiz, archivo))
+            except OSError:
+                pass
+    return total
+
+def desalojar_cache(tamaño_maximo: int = None):
+    """
+    Elimina las entradas usadas hace más tiempo hasta que el cache ocupe a lo más tamaño_maximo bytes
+
+    Returns:
+        Número de entradas eliminadas
+    """
+    tamaño_maximo = TAMAÑO_MAXIMO_CACHE if tamaño_maximo is None else tamaño_maximo
+    if not os.path.isdir(DIRECTORIO_CACHE):
+        return 0
+
+    entradas = []
+    for nombre in os.listdir(DIRECTORIO_CACHE):
+        ruta = os.path.join(DIRECTORIO_CACHE, nombre)
+        if nombre.startswith('.tmp-'):
+            # Restos de escrituras abortadas por un reinicio
+            if time.time() - os.path.getmtime(ruta) > 24 * 3600:
+                shutil.rmtree(ruta, ignore_errors=True)
+            continue
+        try:
+            entradas.append((os.path.getmtime(ruta), _tamaño_directorio(ruta), ruta))
+        except OSError:
+            continue
+
+    total = sum(tamaño for _, tamaño, _ in entradas)
+    eliminadas = 0
+    for _, tamaño, ruta in sorted(entradas):
+        if total <= tamaño_maximo:
+            break
+        shutil.rmtree(ruta, ignore_errors=True)
+        total -= tamaño
+        eliminadas += 1
+    return eliminadas
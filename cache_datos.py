@@ -0,0 +1,340 @@
+"""
+Cache de datos compartido por todas las sesiones del proceso
+Cada entrada se guarda junto con la versión de su conjunto de datos (tabla
+versiones_datos) y se sirve desde memoria mientras esa versión no cambie. Las cargas
+incrementan la versión solo del conjunto que modifican, así una importación de
+adquisiciones no invalida los datos de programación, y el cambio se detecta también
+en los demás procesos del servidor.
+
+Las tablas grandes se guardan completas en una TablaIncremental: cuando su versión
+cambia solo se leen las filas con updated_at posterior a la marca de agua y las
+lápidas de las filas eliminadas (tabla registros_eliminados).
+
+Cuando la versión cambia, las entradas anteriores se siguen sirviendo mientras un hilo
+de fondo calcula las nuevas (stale-while-revalidate): después del primer cálculo
+ninguna página espera una consulta a la BD.
+
+Los valores entregados son compartidos: quien los use no debe modificarlos.
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import fields, is_dataclass
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+from database import CONJUNTO_ADQUISICIONES
+from db_operations import (
+    obtener_versiones_datos,
+    obtener_eliminados,
+    consultar_cambios_adquisiciones_df,
+    contar_adquisiciones,
+    concatenar_con_categorias,
+    DIAS_RETENCION_ELIMINADOS
+)
+
+# Segundos entre consultas a versiones_datos; en ese lapso se usan las versiones ya leídas
+INTERVALO_VERSIONES = float(os.getenv('CACHE_DATOS_INTERVALO', '2'))
+# Entradas máximas y memoria máxima que ocupan sus valores; al superar cualquiera de
+# los dos se descartan las usadas hace más tiempo
+MAX_ENTRADAS = int(os.getenv('CACHE_DATOS_ENTRADAS', '256'))
+MAX_BYTES = int(float(os.getenv('CACHE_DATOS_MB', '512')) * 1024 * 1024)
+# Lapso anterior a la marca de agua que se vuelve a leer: cubre las transacciones que
+# confirmaron después de la lectura anterior con un updated_at más antiguo
+MARGEN_MARCA_DE_AGUA = timedelta(seconds=float(os.getenv('CACHE_DATOS_MARGEN', '300')))
+# Servir las entradas de una versión anterior mientras se recalculan en segundo plano
+REVALIDAR_EN_SEGUNDO_PLANO = os.getenv('CACHE_DATOS_REVALIDAR', '1') != '0'
+# Hilos para los recálculos de fondo; pocos, para no ocupar el pool de conexiones
+HILOS_REVALIDACION = int(os.getenv('CACHE_DATOS_HILOS', '2'))
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_entradas = OrderedDict()  # (conjunto, clave) -> (versión, valor, bytes)
+_bytes = 0  # suma de los bytes de las entradas
+_en_curso = {}  # (conjunto, clave, versión) -> _Carga que otro hilo está calculando
+_versiones = {}
+_versiones_leidas_en = None
+_leyendo_versiones = False
+_estadisticas = {'aciertos': 0, 'fallos': 0, 'vencidos': 0, 'esperas': 0, 'segundos_espera': 0.0,
+                 'max_segundos_espera': 0.0, 'errores_revalidacion': 0}
+_por_tipo = {}  # tipo de clave (su primer elemento, p. ej. 'vista') -> {'aciertos': n, 'fallos': n}
+_ejecutor = ThreadPoolExecutor(max_workers=HILOS_REVALIDACION, thread_name_prefix='cache_datos')
+
+class _Carga:
+    """Cálculo en curso de una entrada; los demás hilos que la piden esperan su resultado"""
+
+    def __init__(self):
+        self.terminada = threading.Event()
+        self.valor = None
+        self.error = None
+
+def _contar(clave, evento: str):
+    """Suma un acierto o fallo al tipo de la clave; se llama con _lock tomado"""
+    tipo = clave[0] if isinstance(clave, tuple) else clave
+    contadores = _por_tipo.setdefault(tipo, {'aciertos': 0, 'fallos': 0})
+    contadores[evento] += 1
+
+def tamaño_en_memoria(valor) -> int:
+    """
+    Bytes aproximados de un valor del cache: DataFrames con memory_usage(deep=True),
+    arreglos con nbytes, contenedores y dataclasses sumando sus elementos; un objeto
+    puede declarar el suyo con un método tamaño_en_memoria()
+    """
+    if hasattr(valor, 'tamaño_en_memoria'):
+        return valor.tamaño_en_memoria()
+    if isinstance(valor, pd.DataFrame):
+        return int(valor.memory_usage(deep=True).sum())
+    if isinstance(valor, pd.Series):
+        return int(valor.memory_usage(deep=True))
+    if isinstance(valor, np.ndarray):
+        return valor.nbytes
+    if isinstance(valor, dict):
+        return sum(tamaño_en_memoria(v) for v in valor.values())
+    if isinstance(valor, (list, tuple)):
+        return sum(tamaño_en_memoria(v) for v in valor)
+    if is_dataclass(valor):
+        return sum(tamaño_en_memoria(getattr(valor, campo.name)) for campo in fields(valor))
+    if hasattr(valor, '__dict__'):
+        return sum(tamaño_en_memoria(v) for v in vars(valor).values())
+    return sys.getsizeof(valor)
+
+def _quitar(llave):
+    """Descarta una entrada; se llama con _lock tomado"""
+    global _bytes
+    _bytes -= _entradas.pop(llave)[2]
+
+def _guardar(llave, version, valor, tamaño: int):
+    """Guarda una entrada y descarta las usadas hace más tiempo hasta volver a los límites; se llama con _lock tomado"""
+    global _bytes
+    if llave in _entradas:
+        _quitar(llave)
+    _entradas[llave] = (version, valor, tamaño)
+    _bytes += tamaño
+    # La entrada recién guardada se conserva aunque sola supere MAX_BYTES
+    while len(_entradas) > 1 and (len(_entradas) > MAX_ENTRADAS or _bytes > MAX_BYTES):
+        _quitar(next(iter(_entradas)))
+
+def versiones(forzar: bool = False) -> dict:
+    """
+    Versión vigente de cada conjunto, leída de la BD a lo más cada INTERVALO_VERSIONES segundos
+
+    Al detectar que un conjunto cambió de versión se descartan sus entradas, salvo con
+    REVALIDAR_EN_SEGUNDO_PLANO: entonces se conservan para servirlas mientras se recalculan.
+    Con forzar se descartan siempre.
+    """
+    global _versiones, _versiones_leidas_en, _leyendo_versiones
+    with _lock:
+        vigentes = _versiones_leidas_en is not None \
+            and time.monotonic() - _versiones_leidas_en < INTERVALO_VERSIONES
+        # Mientras otro hilo relee las versiones se siguen usando las anteriores
+        if (vigentes and not forzar) or (_leyendo_versiones and _versiones_leidas_en is not None):
+            return _versiones
+        _leyendo_versiones = True
+
+    try:
+        nuevas = obtener_versiones_datos()
+    finally:
+        with _lock:
+            _leyendo_versiones = False
+
+    with _lock:
+        _versiones, _versiones_leidas_en = nuevas, time.monotonic()
+        if REVALIDAR_EN_SEGUNDO_PLANO and not forzar:
+            return _versiones
+        for llave in [llave for llave, entrada in _entradas.items() if nuevas.get(llave[0]) != entrada[0]]:
+            _quitar(llave)
+        return _versiones
+
+def obtener(conjunto: str, clave, cargar, servir_vencido: bool = True):
+    """
+    Valor en cache de (conjunto, clave) para la versión vigente del conjunto, o el
+    resultado de cargar() si no está o es de una versión anterior
+
+    Si varias sesiones piden a la vez la misma entrada ausente, solo la primera ejecuta
+    cargar(); las demás esperan ese resultado (o su excepción) en lugar de repetir la
+    consulta y ocupar otra conexión del pool. Con REVALIDAR_EN_SEGUNDO_PLANO, si hay una
+    entrada de una versión anterior se entrega esa y cargar() se ejecuta en un hilo de fondo.
+
+    Args:
+        conjunto: Conjunto de datos del que depende el valor (CONJUNTO_PROGRAMACION, ...)
+        clave: Identifica el valor dentro del conjunto; debe ser hasheable
+        cargar: Función sin argumentos que calcula el valor
+        servir_vencido: False para esperar siempre el valor de la versión vigente; lo usan
+                        las cargas que se arman a partir de otra entrada del cache
+    """
+    llave = (conjunto, clave)
+    version = versiones().get(conjunto)
+    with _lock:
+        entrada = _entradas.get(llave)
+        if entrada is not None and entrada[0] == version:
+            _entradas.move_to_end(llave)
+            _estadisticas['aciertos'] += 1
+            _contar(clave, 'aciertos')
+            return entrada[1]
+        carga = _en_curso.get(llave + (version,))
+        if entrada is not None and REVALIDAR_EN_SEGUNDO_PLANO and servir_vencido:
+            _estadisticas['vencidos'] += 1
+            _contar(clave, 'aciertos')
+            if carga is None:
+                carga = _en_curso[llave + (version,)] = _Carga()
+                _estadisticas['fallos'] += 1
+                _ejecutor.submit(_revalidar, llave, version, carga, cargar)
+            _entradas.move_to_end(llave)
+            return entrada[1]
+        _contar(clave, 'fallos')
+        propia = carga is None
+        if propia:
+            carga = _en_curso[llave + (version,)] = _Carga()
+            _estadisticas['fallos'] += 1
+
+    if not propia:
+        inicio = time.monotonic()
+        carga.terminada.wait()
+        espera = time.monotonic() - inicio
+        with _lock:
+            _estadisticas['esperas'] += 1
+            _estadisticas['segundos_espera'] += espera
+            _estadisticas['max_segundos_espera'] = max(_estadisticas['max_segundos_espera'], espera)
+        if carga.error is not None:
+            raise carga.error
+        return carga.valor
+
+    _cargar(llave, version, carga, cargar)
+    return carga.valor
+
+def _cargar(llave, version, carga: _Carga, cargar):
+    """Ejecuta cargar(), guarda el resultado como entrada de version y despierta a los que esperan"""
+    try:
+        carga.valor = cargar()
+        tamaño = tamaño_en_memoria(carga.valor)
+    except BaseException as e:
+        carga.error = e
+        raise
+    finally:
+        with _lock:
+            del _en_curso[llave + (version,)]
+            if carga.error is None:
+                _guardar(llave, version, carga.valor, tamaño)
+        carga.terminada.set()
+
+def _revalidar(llave, version, carga: _Carga, cargar):
+    """Recálculo de fondo; si falla se sigue sirviendo la entrada anterior y se reintenta en el próximo pedido"""
+    try:
+        _cargar(llave, version, carga, cargar)
+    except Exception:
+        with _lock:
+            _estadisticas['errores_revalidacion'] += 1
+        logger.exception("No se pudo recalcular la entrada %s del cache", llave)
+
+def estadisticas() -> dict:
+    """
+    Contadores del cache desde que arrancó el proceso
+
+    Returns:
+        Dict con aciertos, fallos (cargas ejecutadas), vencidos (pedidos atendidos con
+        una entrada anterior mientras se recalculaba), esperas (pedidos que esperaron una
+        carga en curso de otro hilo), segundos_espera (total), max_segundos_espera,
+        errores_revalidacion, entradas y bytes guardados, y por_tipo: por tipo de clave
+        ('filas', 'vista', ...), los pedidos atendidos desde el cache (aciertos) y los
+        que esperaron un cálculo (fallos)
+    """
+    with _lock:
+        return dict(_estadisticas, entradas=len(_entradas), bytes=_bytes,
+                    por_tipo={tipo: dict(c) for tipo, c in _por_tipo.items()})
+
+def refrescar_versiones():
+    """
+    Vuelve a leer las versiones ya mismo, sin esperar el intervalo, y descarta las
+    entradas vencidas: la sesión que terminó una importación ve sus datos sin esperar
+    el recálculo de fondo
+    """
+    return versiones(forzar=True)
+
+def invalidar(conjunto: str = None):
+    """Descarta las entradas de un conjunto, o todas"""
+    with _lock:
+        for llave in [llave for llave in _entradas if conjunto is None or llave[0] == conjunto]:
+            _quitar(llave)
+
+class TablaIncremental:
+    """
+    DataFrame completo de una tabla, mantenido al día con una marca de agua
+
+    Al cambiar la versión del conjunto se leen solo las filas modificadas desde la
+    marca de agua (menos MARGEN_MARCA_DE_AGUA) y las lápidas del mismo lapso, y se
+    combinan por id con el DataFrame anterior; lo transferido desde la BD depende de
+    lo que cambió y no del tamaño de la tabla. Si el conteo no coincide con la BD
+    (p. ej. tras un seed que borra sin lápidas) se recarga completa.
+    """
+
+    def __init__(self, conjunto: str, tabla: str, cargar_cambios, contar):
+        """
+        Args:
+            conjunto: Conjunto de datos cuya versión se sigue
+            tabla: Nombre de la tabla en registros_eliminados
+            cargar_cambios: Función cargar_cambios(desde) -> DataFrame indexado por id con
+                            Actualizado_En; desde=None trae todas las filas
+            contar: Función sin argumentos con el número de filas en la BD
+        """
+        self.conjunto = conjunto
+        self.tabla = tabla
+        self._cargar_cambios = cargar_cambios
+        self._contar = contar
+        self._lock = threading.Lock()
+        self._df = None
+        self._version = None
+        self.marca_de_agua = None
+        self.filas_leidas = 0
+
+    def obtener(self) -> pd.DataFrame:
+        """DataFrame de la versión vigente (compartido: no modificarlo)"""
+        version = versiones().get(self.conjunto)
+        with self._lock:
+            if self._df is None or version != self._version:
+                self._actualizar()
+                self._version = version
+            return self._df
+
+    def _actualizar(self):
+        if self._df is None or self.marca_de_agua is None \
+                or datetime.utcnow() - self.marca_de_agua > timedelta(days=DIAS_RETENCION_ELIMINADOS):
+            self._recargar()
+            return
+
+        desde = self.marca_de_agua - MARGEN_MARCA_DE_AGUA
+        # Primero las bajas y luego los cambios: un id eliminado y vuelto a insertar queda
+        eliminados = obtener_eliminados(self.tabla, desde)
+        cambios = self._cargar_cambios(desde)
+        df = self._df.drop(index=eliminados, errors='ignore')
+        if len(cambios):
+            df = concatenar_con_categorias(
+                df.drop(index=cambios.index, errors='ignore'), self._sin_marca(cambios)
+            ).sort_index()
+        self.filas_leidas += len(cambios)
+
+        if len(df) != self._contar():
+            self._recargar()
+            return
+        self._df = df
+
+    def _recargar(self):
+        cambios = self._cargar_cambios(None)
+        self.filas_leidas += len(cambios)
+        self.marca_de_agua = None
+        self._df = self._sin_marca(cambios)
+
+    def _sin_marca(self, cambios: pd.DataFrame):
+        """Avanza la marca de agua con las filas leídas y quita la columna Actualizado_En"""
+        maximo = cambios['Actualizado_En'].max()
+        if pd.notna(maximo) and (self.marca_de_agua is None or maximo > self.marca_de_agua):
+            self.marca_de_agua = maximo.to_pydatetime()
+        return cambios.drop(columns='Actualizado_En')
+
+adquisiciones = TablaIncremental(
+    CONJUNTO_ADQUISICIONES, 'adquisiciones', consultar_cambios_adquisiciones_df, contar_adquisiciones
+)
@@ -0,0 +1,120 @@
+"""
+Cubo OLAP en memoria de las adquisiciones
+Guarda en un arreglo denso de NumPy la cantidad y los montos de las adquisiciones
+por cada combinación de Año, UE, Meta, Tipo_Servicio y Estado. Un filtro del tablero
+se resuelve tomando los índices elegidos de cada eje y sumando, sin recorrer filas:
+el costo depende del tamaño del cubo y no del número de adquisiciones.
+"""
+import numpy as np
+import pandas as pd
+from db_operations import FiltroAdquisiciones, obtener_resumen_adquisiciones_df
+
+# Ejes del cubo: columna del DataFrame de origen -> campo de FiltroAdquisiciones
+DIMENSIONES = {
+    'Año': 'años',
+    'UE': 'ues',
+    'Meta_Codigo': 'metas',
+    'Tipo_Servicio': 'tipos',
+    'Estado': 'estados',
+}
+MEDIDAS = ['Cantidad', 'Monto_Referencial', 'Monto_Adjudicado']
+
+class CuboAdquisiciones:
+    """
+    Cubo denso de forma (medidas, años, UEs, metas, tipos, estados)
+
+    Attributes:
+        valores: Dict dimensión -> lista ordenada de sus valores (el índice en la
+                 lista es la posición en el eje)
+        datos: Arreglo float64; el primer eje son las MEDIDAS, así cada medida es un bloque contiguo
+    """
+
+    def __init__(self, valores: dict, datos: np.ndarray):
+        self.valores = valores
+        self.datos = datos
+        self._posiciones = {
+            dimension: {valor: i for i, valor in enumerate(lista)} for dimension, lista in valores.items()
+        }
+
+    @classmethod
+    def desde_df(cls, df: pd.DataFrame):
+        """
+        Arma el cubo desde filas con las columnas de DIMENSIONES y MEDIDAS, como las
+        de obtener_resumen_adquisiciones_df (Cantidad es el número de adquisiciones)
+        """
+        valores, codigos = {}, []
+        for dimension in DIMENSIONES:
+            categorias = sorted(df[dimension].dropna().unique().tolist())
+            valores[dimension] = categorias
+            codigos.append(pd.Categorical(df[dimension], categories=categorias).codes)
+
+        forma = tuple(len(valores[dimension]) for dimension in DIMENSIONES)
+        datos = np.zeros((len(MEDIDAS),) + forma)
+        validas = np.all([c >= 0 for c in codigos], axis=0) if len(df) else np.zeros(0, dtype=bool)
+        if validas.any():
+            plano = np.ravel_multi_index([c[validas] for c in codigos], forma)
+            for k, medida in enumerate(MEDIDAS):
+                pesos = df[medida].to_numpy(dtype=float)[validas]
+                datos[k] = np.bincount(plano, weights=pesos, minlength=datos[k].size).reshape(forma)
+        return cls(valores, datos)
+
+    def _indices(self, filtro: FiltroAdquisiciones):
+        """Posiciones elegidas en cada eje (None = todo el eje); los valores ausentes del cubo se ignoran"""
+        indices = []
+        for dimension, campo in DIMENSIONES.items():
+            elegidos = getattr(filtro, campo) if filtro is not None else ()
+            if not elegidos:
+                indices.append(None)
+                continue
+            posiciones = self._posiciones[dimension]
+            indices.append(np.array([posiciones[v] for v in elegidos if v in posiciones], dtype=np.intp))
+        return indices
+
+    def _reducir(self, filtro: FiltroAdquisiciones, conservar: str = None):
+        """Suma el cubo sobre todos los ejes salvo conservar, tomando solo las posiciones del filtro"""
+        datos = self.datos
+        for eje, indices in enumerate(self._indices(filtro), start=1):
+            if indices is not None:
+                datos = datos.take(indices, axis=eje)
+        if conservar is None:
+            return datos.reshape(len(MEDIDAS), -1).sum(axis=1)
+        # Se lleva el eje a conservar al frente de cada medida y se suma el resto de una vez
+        eje = list(DIMENSIONES).index(conservar) + 1
+        datos = np.moveaxis(datos, eje, 1)
+        return datos.reshape(datos.shape[:2] + (int(np.prod(datos.shape[2:])),)).sum(axis=2)
+
+    def totales(self, filtro: FiltroAdquisiciones = None):
+        """
+        Cantidad y montos totales de las adquisiciones que cumplen el filtro
+
+        Returns:
+            Dict con las MEDIDAS; Cantidad como int
+        """
+        suma = self._reducir(filtro)
+        totales = dict(zip(MEDIDAS, suma.tolist()))
+        totales['Cantidad'] = int(round(totales['Cantidad']))
+        return totales
+
+    def por(self, dimension: str, filtro: FiltroAdquisiciones = None):
+        """
+        Cantidad y montos por cada valor de una dimensión, como un groupby sobre las filas filtradas
+
+        Returns:
+            DataFrame con la dimensión y las MEDIDAS, sin los valores que no tienen adquisiciones
+        """
+        suma = self._reducir(filtro, conservar=dimension)
+        indices = self._indices(filtro)[list(DIMENSIONES).index(dimension)]
+        etiquetas = np.array(self.valores[dimension], dtype=object)
+        if indices is not None:
+            etiquetas = etiquetas[indices]
+        con_datos = suma[0] > 0
+        return pd.DataFrame({
+            dimension: etiquetas[con_datos],
+            'Cantidad': suma[0, con_datos].round().astype('int64'),
+            'Monto_Referencial': suma[1, con_datos],
+            'Monto_Adjudicado': suma[2, con_datos],
+        })
+
+def cargar_cubo_adquisiciones(db=None) -> CuboAdquisiciones:
+    """Arma el cubo desde resumen_adquisiciones (unos cientos de filas)"""
+    return CuboAdquisiciones.desde_df(obtener_resumen_adquisiciones_df(None, db))
@@ -1,5 +1,5 @@
 import os
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, ForeignKey, Boolean, Text
+from sqlalchemy import create_engine, Column, Integer, BigInteger, String, Float, DateTime, ForeignKey, Boolean, Text, Index, inspect, text, select, insert
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime
@@ -62,11 +62,47 @@ class ProgramacionPresupuestal(Base):
     total_anual = Column(Float, default=0)
     saldo = Column(Float, default=0)
     
+    # Huellas de importación: clave identifica la fila dentro del año y huella su contenido
+    clave = Column(BigInteger, nullable=True)
+    huella = Column(BigInteger, nullable=True)
+    
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     unidad_ejecutora = relationship("UnidadEjecutora", back_populates="programaciones")
     meta = relationship("MetaPresupuestal", back_populates="programaciones")
+    
+    # Índices de los filtros/agrupaciones del tablero; en PostgreSQL el primero cubre los montos más usados
+    __table_args__ = (
+        Index('ix_programacion_anio_ue_meta', 'año', 'unidad_ejecutora_id', 'meta_id',
+              postgresql_include=['pim', 'certificado', 'devengado_acumulado']),
+        Index('ix_programacion_anio_clave', 'año', 'clave'),
+    )
+
+class ProgramacionStaging(Base):
+    """Carga intermedia de programación; cada importación escribe bajo su propio lote"""
+    __tablename__ = 'programacion_presupuestal_staging'
+    
+    id = Column(Integer, primary_key=True)
+    lote = Column(String(32), nullable=False, index=True)
+    año = Column(Integer, nullable=False)
+    unidad_ejecutora_id = Column(Integer, nullable=False)
+    meta_id = Column(Integer, nullable=True)
+    clasificador = Column(String, nullable=True)
+    descripcion_clasificador = Column(Text, nullable=True)
+    
+    pim = Column(Float, default=0)
+    certificado = Column(Float, default=0)
+    pim_por_certificar = Column(Float, default=0)
+    compromiso_anual = Column(Float, default=0)
+    devengado_acumulado = Column(Float, default=0)
+    compromiso_por_devengar = Column(Float, default=0)
+    pim_por_devengar = Column(Float, default=0)
+    total_anual = Column(Float, default=0)
+    saldo = Column(Float, default=0)
+    
+    clave = Column(BigInteger, nullable=True)
+    huella = Column(BigInteger, nullable=True)
 
 class Adquisicion(Base):
     __tablename__ = 'adquisiciones'
@@ -93,6 +129,15 @@ class Adquisicion(Base):
     meta = relationship("MetaPresupuestal")
     detalle = relationship("AdquisicionDetalle", back_populates="adquisicion", uselist=False)
     procesos = relationship("AdquisicionProceso", back_populates="adquisicion", order_by="AdquisicionProceso.orden")
+    
+    __table_args__ = (
+        Index('ix_adquisiciones_anio_ue_meta', 'año', 'unidad_ejecutora_id', 'meta_id',
+              postgresql_include=['estado', 'monto_referencial', 'monto_adjudicado']),
+        Index('ix_adquisiciones_anio_estado', 'año', 'estado',
+              postgresql_include=['monto_referencial', 'monto_adjudicado']),
+        Index('ix_adquisiciones_codigo', 'codigo_adquisicion'),
+        Index('ix_adquisiciones_fecha_adjudicacion', 'fecha_adjudicacion'),
+    )
 
 class AdquisicionDetalle(Base):
     __tablename__ = 'adquisiciones_detalle'
@@ -108,6 +153,10 @@ class AdquisicionDetalle(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     
     adquisicion = relationship("Adquisicion", back_populates="detalle")
+    
+    __table_args__ = (
+        Index('ix_adquisiciones_detalle_tipo', 'tipo_servicio'),
+    )
 
 class AdquisicionProceso(Base):
     __tablename__ = 'adquisiciones_proceso'
@@ -127,6 +176,77 @@ class AdquisicionProceso(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     
     adquisicion = relationship("Adquisicion", back_populates="procesos")
+    
+    # Timeline del detalle: hitos de una adquisición en orden
+    __table_args__ = (
+        Index('ix_adquisiciones_proceso_adq_orden', 'adquisicion_id', 'orden'),
+    )
+
+class ResumenProgramacion(Base):
+    """Programación sumada por año, UE, meta y clasificador; se reconstruye por año en cada carga"""
+    __tablename__ = 'resumen_programacion'
+
+    id = Column(Integer, primary_key=True)
+    año = Column(Integer, nullable=False, index=True)
+    unidad_ejecutora_id = Column(Integer, nullable=False)
+    meta_id = Column(Integer, nullable=True)
+    clasificador = Column(String, nullable=True)
+    descripcion_clasificador = Column(Text, nullable=True)
+
+    pim = Column(Float, default=0)
+    certificado = Column(Float, default=0)
+    pim_por_certificar = Column(Float, default=0)
+    compromiso_anual = Column(Float, default=0)
+    devengado_acumulado = Column(Float, default=0)
+    compromiso_por_devengar = Column(Float, default=0)
+    pim_por_devengar = Column(Float, default=0)
+    total_anual = Column(Float, default=0)
+    saldo = Column(Float, default=0)
+    filas = Column(Integer, default=0)
+
+class ResumenAdquisiciones(Base):
+    """
+    Adquisiciones contadas y sumadas por año, UE, meta, estado, tipo de servicio y mes
+    de adjudicación (NULL si no tiene fecha); se reconstruye por año en cada carga
+    """
+    __tablename__ = 'resumen_adquisiciones'
+
+    id = Column(Integer, primary_key=True)
+    año = Column(Integer, nullable=False, index=True)
+    unidad_ejecutora_id = Column(Integer, nullable=False)
+    meta_id = Column(Integer, nullable=True)
+    estado = Column(String, nullable=False)
+    tipo_servicio = Column(String, nullable=True)
+    mes = Column(Integer, nullable=True)
+
+    cantidad = Column(Integer, default=0)
+    monto_referencial = Column(Float, default=0)
+    monto_adjudicado = Column(Float, default=0)
+
+class VersionDatos(Base):
+    """Versión de cada conjunto de datos; las cargas la incrementan para invalidar los caches (ver cache_datos)"""
+    __tablename__ = 'versiones_datos'
+    
+    conjunto = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class RegistroEliminado(Base):
+    """Lápida de una fila eliminada, para que los caches incrementales también la quiten (ver cache_datos)"""
+    __tablename__ = 'registros_eliminados'
+    
+    id = Column(Integer, primary_key=True)
+    tabla = Column(String, nullable=False)
+    registro_id = Column(Integer, nullable=False)
+    eliminado_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index('ix_registros_eliminados_tabla_fecha', 'tabla', 'eliminado_at'),
+    )
+
+# Conjuntos de datos versionados
+CONJUNTO_PROGRAMACION = 'programacion'
+CONJUNTO_ADQUISICIONES = 'adquisiciones'
 
 class Alerta(Base):
     __tablename__ = 'alertas'
@@ -138,8 +258,95 @@ class Alerta(Base):
     activo = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+class TrabajoImportacion(Base):
+    __tablename__ = 'trabajos_importacion'
+    
+    id = Column(Integer, primary_key=True, index=True)
+    tipo = Column(String, nullable=False)
+    archivo = Column(String, nullable=True)
+    año = Column(Integer, nullable=True)
+    estado = Column(String, nullable=False, default='PENDIENTE')
+    filas_totales = Column(Integer, default=0)
+    filas_procesadas = Column(Integer, default=0)
+    filas_por_segundo = Column(Float, default=0)
+    mensaje = Column(Text, nullable=True)
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
+    iniciado_at = Column(DateTime, nullable=True)
+    finalizado_at = Column(DateTime, nullable=True)
+    # Lo renueva cada tanto el proceso que tiene el trabajo (ver trabajos_importacion)
+    latido_at = Column(DateTime, nullable=True)
+
+def _agregar_columnas_faltantes():
+    """Agrega a las tablas existentes las columnas nuevas de los modelos (create_all no altera tablas)"""
+    inspector = inspect(engine)
+    preparer = engine.dialect.identifier_preparer
+    with engine.begin() as conn:
+        for tabla in Base.metadata.sorted_tables:
+            if not inspector.has_table(tabla.name):
+                continue
+            existentes = {columna['name'] for columna in inspector.get_columns(tabla.name)}
+            for columna in tabla.columns:
+                if columna.name in existentes:
+                    continue
+                tipo = columna.type.compile(dialect=engine.dialect)
+                conn.execute(text(
+                    f"ALTER TABLE {preparer.format_table(tabla)} ADD COLUMN {preparer.quote(columna.name)} {tipo}"
+                ))
+
+def _crear_indices_faltantes():
+    """
+    Crea en las tablas existentes los índices declarados en los modelos que aún no existen
+    
+    Returns:
+        Nombres de los índices creados
+    """
+    inspector = inspect(engine)
+    creados = []
+    with engine.begin() as conn:
+        for tabla in Base.metadata.sorted_tables:
+            if not inspector.has_table(tabla.name):
+                continue
+            existentes = {indice['name'] for indice in inspector.get_indexes(tabla.name)}
+            for indice in tabla.indexes:
+                if indice.name not in existentes:
+                    indice.create(bind=conn)
+                    creados.append(indice.name)
+    return creados
+
+# Índices que ya no se declaran y que init_db elimina de las bases existentes
+INDICES_OBSOLETOS = {
+    # Lo cubre ix_programacion_anio_clave: toda búsqueda por clave filtra antes por año
+    'programacion_presupuestal': ['ix_programacion_presupuestal_clave'],
+}
+
+def _eliminar_indices_obsoletos():
+    """Elimina los índices de INDICES_OBSOLETOS que sigan en la base"""
+    inspector = inspect(engine)
+    preparer = engine.dialect.identifier_preparer
+    with engine.begin() as conn:
+        for tabla, nombres in INDICES_OBSOLETOS.items():
+            if not inspector.has_table(tabla):
+                continue
+            existentes = {indice['name'] for indice in inspector.get_indexes(tabla)}
+            for nombre in nombres:
+                if nombre in existentes:
+                    conn.execute(text(f"DROP INDEX {preparer.quote(nombre)}"))
+
+def _registrar_conjuntos_datos():
+    """Crea en versiones_datos la fila de cada conjunto que aún no la tiene"""
+    with engine.begin() as conn:
+        existentes = set(conn.execute(select(VersionDatos.conjunto)).scalars())
+        nuevos = [c for c in (CONJUNTO_PROGRAMACION, CONJUNTO_ADQUISICIONES) if c not in existentes]
+        if nuevos:
+            conn.execute(insert(VersionDatos), [{'conjunto': c, 'version': 0} for c in nuevos])
+
 def init_db():
     Base.metadata.create_all(bind=engine)
+    _agregar_columnas_faltantes()
+    _crear_indices_faltantes()
+    _eliminar_indices_obsoletos()
+    _registrar_conjuntos_datos()
 
 def get_db():
     db = SessionLocal()
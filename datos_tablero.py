@@ -0,0 +1,150 @@
+"""
+Datos de los tableros
+Funciones de carga que usan las páginas y el precalentamiento: todas pasan por el
+cache del proceso (ver cache_datos) con las mismas claves, así lo que se precalienta
+al arrancar es exactamente lo que pide la primera visita.
+Los DataFrames entregados son compartidos: no se modifican.
+"""
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+import pandas as pd
+from database import SessionLocal, init_db, CONJUNTO_ADQUISICIONES, CONJUNTO_PROGRAMACION
+from db_operations import (
+    obtener_resumen_adquisiciones_df,
+    obtener_resumen_programacion_df,
+    obtener_opciones_filtro_adquisiciones,
+    obtener_detalle_adquisicion,
+    reconstruir_resumenes,
+    FiltroAdquisiciones
+)
+from cubo_adquisiciones import cargar_cubo_adquisiciones
+from indice_filtros import IndiceFiltros
+from trabajos_importacion import marcar_trabajos_interrumpidos, iniciar_latidos
+import cache_datos
+
+TIPOS_PERMITIDOS = ['BIEN', 'SERVICIO']
+ESTADOS_PERMITIDOS = ['EN PROCESO', 'CULMINADO', 'CANCELADO', 'HISTORICO', 'NO INICIADO']
+AÑO_POR_DEFECTO = 2025
+# Detalles de adquisición guardados; al superarlos se descartan los usados hace más tiempo
+MAX_DETALLES = int(os.getenv('CACHE_DETALLES', '512'))
+
+def inicializar_base_datos():
+    """Crea las tablas y columnas nuevas, cierra los trabajos interrumpidos y arma los resúmenes faltantes"""
+    init_db()
+    marcar_trabajos_interrumpidos()
+    iniciar_latidos()
+    db = SessionLocal()
+    try:
+        # Bases cargadas antes de existir las tablas de resumen
+        reconstruir_resumenes(db, solo_si_faltan=True)
+    finally:
+        db.close()
+
+def cargar_opciones_filtro():
+    """Carga los valores disponibles para los filtros"""
+    return cache_datos.obtener(CONJUNTO_ADQUISICIONES, 'opciones_filtro', obtener_opciones_filtro_adquisiciones)
+
+def filtro_inicial(opciones_filtro: dict) -> FiltroAdquisiciones:
+    """Selección con la que abren los filtros del dashboard de adquisiciones"""
+    descripciones_meta = dict(zip(opciones_filtro['metas']['codigo'], opciones_filtro['metas']['descripcion']))
+    metas = list(descripciones_meta)
+    return FiltroAdquisiciones(
+        años=(AÑO_POR_DEFECTO,) if AÑO_POR_DEFECTO in opciones_filtro['años'] else (),
+        ues=list(opciones_filtro['ues']),
+        metas=metas[:5],
+        tipos=[t for t in TIPOS_PERMITIDOS if t in opciones_filtro['tipos']],
+        estados=[e for e in ESTADOS_PERMITIDOS if e in opciones_filtro['estados']]
+    )
+
+def obtener_indice_adquisiciones():
+    """
+    Índice de bitmaps de la tabla completa de adquisiciones, que cache_datos mantiene
+    al día leyendo solo las filas modificadas; se arma una vez por versión
+    """
+    return cache_datos.obtener(
+        CONJUNTO_ADQUISICIONES, 'indice',
+        lambda: IndiceFiltros(cache_datos.adquisiciones.obtener()),
+        servir_vencido=False
+    )
+
+def cargar_datos_adquisiciones(filtro: FiltroAdquisiciones):
+    """Adquisiciones que cumplen el filtro, resueltas en memoria con el índice de bitmaps"""
+    return cache_datos.obtener(
+        CONJUNTO_ADQUISICIONES, ('filas', filtro), lambda: obtener_indice_adquisiciones().filtrar(filtro)
+    )
+
+def cargar_resumen_adquisiciones(filtro: FiltroAdquisiciones, servir_vencido: bool = True):
+    """Carga las filas del resumen de adquisiciones que cumplen el filtro"""
+    return cache_datos.obtener(
+        CONJUNTO_ADQUISICIONES, ('resumen', filtro), lambda: obtener_resumen_adquisiciones_df(filtro), servir_vencido
+    )
+
+def obtener_cubo_adquisiciones(servir_vencido: bool = True):
+    """Cubo de indicadores compartido por todas las sesiones (solo lectura)"""
+    return cache_datos.obtener(CONJUNTO_ADQUISICIONES, 'cubo', cargar_cubo_adquisiciones, servir_vencido)
+
+@dataclass(frozen=True)
+class VistaAdquisiciones:
+    """
+    Indicadores y agregados de una selección de filtros (solo lectura)
+
+    Attributes:
+        totales: Cantidad y montos totales, como CuboAdquisiciones.totales
+        por_estado: Cantidad y montos por Estado
+        por_ue: Cantidad y montos por UE
+        por_mes: Monto_Adjudicado por Mes de adjudicación (int); sin las adquisiciones sin fecha
+    """
+    totales: dict
+    por_estado: pd.DataFrame
+    por_ue: pd.DataFrame
+    por_mes: pd.DataFrame
+
+def _armar_vista_adquisiciones(filtro: FiltroAdquisiciones):
+    # Se arma desde otras entradas del cache: deben ser de la versión vigente
+    cubo = obtener_cubo_adquisiciones(servir_vencido=False)
+    resumen = cargar_resumen_adquisiciones(filtro, servir_vencido=False)
+    con_fecha = resumen[resumen['Mes'].notna()]
+    por_mes = con_fecha.groupby(con_fecha['Mes'].astype(int))['Monto_Adjudicado'].sum().reset_index()
+    return VistaAdquisiciones(
+        totales=cubo.totales(filtro),
+        por_estado=cubo.por('Estado', filtro),
+        por_ue=cubo.por('UE', filtro),
+        por_mes=por_mes
+    )
+
+def cargar_vista_adquisiciones(filtro: FiltroAdquisiciones):
+    """
+    Indicadores de la selección, calculados una vez por versión de los datos y
+    compartidos por todas las sesiones que miran la misma selección
+
+    FiltroAdquisiciones guarda sus valores ordenados y sin repetir, así dos sesiones
+    que eligen lo mismo en otro orden comparten la entrada.
+    """
+    return cache_datos.obtener(CONJUNTO_ADQUISICIONES, ('vista', filtro), lambda: _armar_vista_adquisiciones(filtro))
+
+@lru_cache(maxsize=MAX_DETALLES)
+def _detalle_adquisicion(codigo_adquisicion: str, version):
+    return obtener_detalle_adquisicion(codigo_adquisicion)
+
+def cargar_detalle_adquisicion(codigo_adquisicion: str):
+    """
+    Detalle inmutable de una adquisición, guardado por (código, versión de las
+    adquisiciones): reabrir el modal no consulta la BD y una importación lo renueva
+    """
+    return _detalle_adquisicion(codigo_adquisicion, cache_datos.versiones().get(CONJUNTO_ADQUISICIONES))
+
+def _leer_resumen_programacion():
+    df = obtener_resumen_programacion_df()
+    codigo, meta = df['Meta_Codigo'].astype(str), df['Meta'].astype(str)
+    df['Meta'] = (codigo + ' - ' + meta).where(codigo != '', meta).astype('category')
+    df['Ejecución_%'] = (df['Devengado'] / df['PIM'].where(df['PIM'] > 0) * 100).round(1).fillna(0)
+    return df
+
+def cargar_resumen_programacion():
+    """
+    Programación sumada por año, UE, meta y clasificador, con las columnas que usa
+    el dashboard general; se lee de resumen_programacion y queda en el cache del
+    proceso hasta que una carga cambie la versión de la programación
+    """
+    return cache_datos.obtener(CONJUNTO_PROGRAMACION, 'resumen_general', _leer_resumen_programacion)
@@ -1,8 +1,21 @@
+import io
+import logging
+import os
+import uuid
+import multiprocessing
+from dataclasses import dataclass
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
 import pandas as pd
-import re
-from sqlalchemy.orm import Session
-from database import UnidadEjecutora, MetaPresupuestal, ProgramacionPresupuestal, Adquisicion, AdquisicionDetalle, AdquisicionProceso, Alerta, SessionLocal
+from sqlalchemy import select, insert, update, delete, exists, extract, func, literal, or_, DateTime
+from sqlalchemy.orm import Session, joinedload
+from database import UnidadEjecutora, MetaPresupuestal, ProgramacionPresupuestal, ProgramacionStaging, Adquisicion, AdquisicionDetalle, AdquisicionProceso, ResumenProgramacion, ResumenAdquisiciones, VersionDatos, RegistroEliminado, CONJUNTO_PROGRAMACION, CONJUNTO_ADQUISICIONES, Alerta, SessionLocal
 import numpy as np
+from lectores_excel import TAMAÑO_BLOQUE, contar_filas_excel, iterar_bloques_excel, leer_hoja_excel, nombres_hojas_excel
+from cache_cargas import clave_cache, buscar_en_cache, iterar_tabla_cache, leer_tabla_cache, contar_filas_cache, EscritorCache
+
+logger = logging.getLogger(__name__)
 
 def inicializar_datos_ejemplo(db: Session):
     """Inicializa la base de datos con datos de ejemplo si está vacía"""
@@ -17,108 +30,1026 @@ def inicializar_datos_ejemplo(db: Session):
         db.add(ue)
     db.commit()
 
-def procesar_archivo_programacion(db: Session, archivo, año: int):
+# Columnas de la hoja de programación anual (en el orden del archivo SIAF)
+COLUMNAS_PROGRAMACION = ['Descripcion', 'PIM', 'CERTIFICADO', 'PIM_POR_CERTIFICAR', 'COMPROMISO_ANUAL',
+                         'DEVENGADO_ACUMULADO', 'COMPROMISO_ANUAL_POR_DEVENGAR', 'PIM_POR_DEVENGAR',
+                         'NOV_Programacion', 'NOV_Ejecucion', 'NOV_Pendiente', 'DIC_Prog',
+                         'TOTAL_ANUAL', 'SALDO']
+
+# Columnas de montos del Excel -> campos de ProgramacionPresupuestal
+COLUMNAS_MONTOS = {
+    'PIM': 'pim',
+    'CERTIFICADO': 'certificado',
+    'PIM_POR_CERTIFICAR': 'pim_por_certificar',
+    'COMPROMISO_ANUAL': 'compromiso_anual',
+    'DEVENGADO_ACUMULADO': 'devengado_acumulado',
+    'COMPROMISO_ANUAL_POR_DEVENGAR': 'compromiso_por_devengar',
+    'PIM_POR_DEVENGAR': 'pim_por_devengar',
+    'TOTAL_ANUAL': 'total_anual',
+    'SALDO': 'saldo',
+}
+
+def _parsear_programacion(df: pd.DataFrame, contexto: dict = None):
+    """
+    Clasifica de forma vectorizada las filas jerárquicas (UE / Meta / clasificador)
+    de la hoja de programación anual
+
+    Args:
+        df: DataFrame leído con skiprows=4 (14 columnas), completo o un bloque
+        contexto: Dict con la UE/Meta vigentes al final del bloque anterior; se
+                  actualiza para el bloque siguiente
+
+    Returns:
+        Tuple (registros, ues, metas):
+            registros: DataFrame con ue_codigo, meta_codigo, clasificador,
+                       descripcion_clasificador y los campos de COLUMNAS_MONTOS
+            ues: códigos de UE en orden de aparición
+            metas: DataFrame con codigo/descripcion de cada meta (primera aparición)
+    """
+    df = df.copy()
+    df.columns = COLUMNAS_PROGRAMACION
+
+    df = df[df['Descripcion'] != 'ddnntt / meta / clasificador']
+    df = df.dropna(subset=['Descripcion'])
+
+    desc = df['Descripcion'].astype(str).str.strip()
+
+    # Tipo de fila: UE (código en mayúsculas) o Meta ("0046 - ...")
+    es_ue = desc.str.match(r'^[A-Z]{3,5}$')
+    es_meta = ~es_ue & desc.str.startswith('0') & desc.str.contains(' - ', regex=False)
+
+    partes_meta = desc[es_meta].str.split(' - ', n=1, expand=True).reindex(columns=[0, 1]).astype(object)
+    metas = pd.DataFrame({
+        'codigo': partes_meta[0].str.strip(),
+        'descripcion': partes_meta[1].str.strip(),
+    }).drop_duplicates(subset='codigo')
+
+    # Contexto jerárquico: la UE se arrastra hacia abajo; la Meta se reinicia en cada UE
+    contexto = contexto if contexto is not None else {}
+    ue_contexto = desc.where(es_ue).ffill().fillna(contexto.get('ue') or np.nan)
+    meta_codigo = pd.Series(np.nan, index=desc.index, dtype=object)
+    meta_codigo[es_meta] = partes_meta[0].str.strip()
+    meta_codigo[es_ue] = ''
+    meta_codigo = meta_codigo.ffill().fillna(contexto.get('meta') or '')
+
+    if len(desc) > 0:
+        contexto['ue'] = ue_contexto.iloc[-1] if pd.notna(ue_contexto.iloc[-1]) else None
+        contexto['meta'] = meta_codigo.iloc[-1] or None
+    meta_codigo = meta_codigo.replace('', np.nan)
+
+    # Filas de detalle: no son UE/Meta, tienen PIM y ya hay una UE en contexto
+    es_detalle = ~es_ue & ~es_meta & df['PIM'].notna() & ue_contexto.notna()
+    desc_detalle = desc[es_detalle]
+
+    # Separar el código del clasificador ("2.3. 1. 1. ...") en bloque
+    tiene_codigo = desc_detalle.str.match(r'^\d+\.\s*\d+\.')
+    partes_clas = desc_detalle.str.split(' ', n=1, expand=True).reindex(columns=[0, 1]).astype(object)
+    clasificador = partes_clas[0].str.strip().where(tiene_codigo)
+    descripcion_clasificador = partes_clas[1].str.strip().fillna(desc_detalle).where(tiene_codigo, desc_detalle)
+
+    registros = pd.DataFrame({
+        'ue_codigo': ue_contexto[es_detalle],
+        'meta_codigo': meta_codigo[es_detalle],
+        'clasificador': clasificador.astype(object).where(clasificador.notna(), None),
+        'descripcion_clasificador': descripcion_clasificador,
+    })
+    for columna_excel, campo in COLUMNAS_MONTOS.items():
+        registros[campo] = df.loc[es_detalle, columna_excel].astype(float).fillna(0)
+
+    return registros.reset_index(drop=True), desc[es_ue].drop_duplicates().tolist(), metas
+
+def _cargar_dimensiones(db: Session):
+    """Carga una sola vez los ids de UE y Meta indexados por código"""
+    ue_ids = dict(db.execute(select(UnidadEjecutora.codigo, UnidadEjecutora.id)).all())
+    
+    meta_ids = {}
+    for codigo, meta_id in db.execute(
+        select(MetaPresupuestal.codigo, MetaPresupuestal.id).order_by(MetaPresupuestal.id)
+    ):
+        meta_ids.setdefault(codigo, meta_id)
+    
+    return ue_ids, meta_ids
+
+def _asegurar_dimensiones(db: Session, ue_ids: dict, meta_ids: dict, ues, metas: pd.DataFrame):
+    """
+    Crea en un solo lote las UE y Metas que aún no existen y actualiza los diccionarios
+    
+    Args:
+        db: Sesión de base de datos
+        ue_ids: Diccionario código -> id de UE (se actualiza)
+        meta_ids: Diccionario código -> id de Meta (se actualiza)
+        ues: Códigos de UE requeridos
+        metas: DataFrame con codigo/descripcion de las Metas requeridas
+    """
+    ues_nuevas = [codigo for codigo in dict.fromkeys(ues) if codigo not in ue_ids]
+    if ues_nuevas:
+        db.execute(insert(UnidadEjecutora), [
+            {'codigo': codigo, 'nombre': f"Unidad {codigo}"} for codigo in ues_nuevas
+        ])
+        ue_ids.update(db.execute(
+            select(UnidadEjecutora.codigo, UnidadEjecutora.id).where(UnidadEjecutora.codigo.in_(ues_nuevas))
+        ).all())
+    
+    metas_nuevas = metas[~metas['codigo'].isin(list(meta_ids))].drop_duplicates(subset='codigo')
+    if len(metas_nuevas) > 0:
+        db.execute(insert(MetaPresupuestal), metas_nuevas[['codigo', 'descripcion']].to_dict('records'))
+        for codigo, meta_id in db.execute(
+            select(MetaPresupuestal.codigo, MetaPresupuestal.id)
+            .where(MetaPresupuestal.codigo.in_(metas_nuevas['codigo'].tolist()))
+            .order_by(MetaPresupuestal.id)
+        ):
+            meta_ids.setdefault(codigo, meta_id)
+
+def _con_marcas_de_tiempo(tabla, registros: pd.DataFrame):
+    """Copia de registros con created_at/updated_at completados si la tabla los tiene"""
+    registros = registros.copy()
+    ahora = datetime.utcnow()
+    for columna in ('created_at', 'updated_at'):
+        if columna in tabla.c and columna not in registros.columns:
+            registros[columna] = ahora
+    return registros
+
+def _insertar_en_bloque(db: Session, tabla, registros: pd.DataFrame):
+    """
+    Inserta un DataFrame en una tabla sin crear objetos ORM por fila
+    
+    En PostgreSQL usa COPY; en otros motores un INSERT con executemany.
+    Las columnas created_at/updated_at se completan si la tabla las tiene.
+    """
+    if len(registros) == 0:
+        return 0
+    
+    registros = _con_marcas_de_tiempo(tabla, registros)
+    bind = db.get_bind()
+    if bind.dialect.name == 'postgresql':
+        preparer = bind.dialect.identifier_preparer
+        buffer = io.StringIO()
+        registros.to_csv(buffer, index=False, header=False, na_rep='\\N')
+        buffer.seek(0)
+        columnas = ', '.join(preparer.quote(columna) for columna in registros.columns)
+        sql = f"COPY {preparer.format_table(tabla)} ({columnas}) FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+        cursor = db.connection().connection.cursor()
+        try:
+            cursor.copy_expert(sql, buffer)
+        finally:
+            cursor.close()
+    else:
+        filas = registros.astype(object).where(registros.notna(), None).to_dict('records')
+        db.execute(insert(tabla), filas)
+    
+    return len(registros)
+
+def _insertar_con_ids(db: Session, tabla, registros: pd.DataFrame):
+    """
+    Inserta un DataFrame en lotes multi-fila y retorna los ids generados en el orden de las filas
+
+    Se usa cuando otras tablas necesitan los ids recién creados (COPY no los retorna).
+    """
+    if len(registros) == 0:
+        return []
+    
+    registros = _con_marcas_de_tiempo(tabla, registros)
+    filas = registros.astype(object).where(registros.notna(), None).to_dict('records')
+    return db.execute(
+        insert(tabla).returning(tabla.c.id, sort_by_parameter_order=True), filas
+    ).scalars().all()
+
+def _calcular_huellas(registros: pd.DataFrame, ocurrencias: dict = None):
+    """
+    Calcula en bloque la clave y la huella de contenido de cada fila de programación
+    
+    La clave identifica la fila dentro del año (UE, meta, clasificador, descripción y
+    número de ocurrencia, ya que el clasificador solo no es único en el archivo SIAF);
+    la huella cambia cuando cambia cualquier monto. ocurrencias arrastra el conteo por
+    llave entre bloques de un mismo archivo.
+    """
+    llave = pd.DataFrame({
+        'ue': registros['ue_codigo'],
+        'meta': registros['meta_codigo'].fillna(''),
+        'clasificador': registros['clasificador'].fillna(''),
+        'descripcion': registros['descripcion_clasificador'],
+    }).astype(str)
+    grupo = pd.Series(pd.util.hash_pandas_object(llave, index=False).to_numpy())
+    llave['ocurrencia'] = grupo.groupby(grupo).cumcount().to_numpy()
+    if ocurrencias is not None:
+        llave['ocurrencia'] += grupo.map(ocurrencias).fillna(0).astype(int).to_numpy()
+        ocurrencias.update((llave['ocurrencia'].groupby(grupo.to_numpy()).max() + 1).to_dict())
+    
+    clave = pd.util.hash_pandas_object(llave, index=False).to_numpy().view(np.int64)
+    # Se redondea para que el ruido de punto flotante de Excel no cuente como cambio
+    huella = pd.util.hash_pandas_object(
+        registros[list(COLUMNAS_MONTOS.values())].round(6), index=False
+    ).to_numpy().view(np.int64)
+    return clave, huella
+
+def _incrementar_version(db: Session, conjunto: str):
+    """Incrementa la versión de un conjunto de datos dentro de la transacción en curso (sin confirmar)"""
+    ahora = datetime.utcnow()
+    actualizadas = db.execute(
+        update(VersionDatos).where(VersionDatos.conjunto == conjunto)
+        .values(version=VersionDatos.version + 1, updated_at=ahora)
+    ).rowcount
+    if not actualizadas:
+        db.execute(insert(VersionDatos).values(conjunto=conjunto, version=1, updated_at=ahora))
+
+# Días que se conservan las lápidas; un cache incremental más desactualizado que esto se recarga completo
+DIAS_RETENCION_ELIMINADOS = 30
+
+def _registrar_eliminados(db: Session, modelo, condicion, ahora: datetime = None):
+    """
+    Deja una lápida por cada fila de modelo que cumple condicion (sin confirmar)
+    
+    Se llama justo antes del DELETE con la misma condición, en la misma transacción;
+    de paso descarta las lápidas más antiguas que DIAS_RETENCION_ELIMINADOS.
+    """
+    ahora = ahora or datetime.utcnow()
+    db.execute(delete(RegistroEliminado).where(
+        RegistroEliminado.eliminado_at < ahora - timedelta(days=DIAS_RETENCION_ELIMINADOS)
+    ))
+    db.execute(insert(RegistroEliminado).from_select(
+        ['tabla', 'registro_id', 'eliminado_at'],
+        select(literal(modelo.__tablename__), modelo.id, literal(ahora, DateTime)).where(condicion)
+    ))
+
+def obtener_eliminados(tabla: str, desde: datetime, db: Session = None):
+    """Ids de las filas de tabla eliminadas después de desde"""
+    # Crear sesión propia si no se proporciona una
+    if db is None:
+        db = SessionLocal()
+        should_close = True
+    else:
+        should_close = False
+
+    try:
+        return db.execute(
+            select(RegistroEliminado.registro_id)
+            .where(RegistroEliminado.tabla == tabla, RegistroEliminado.eliminado_at > desde)
+        ).scalars().all()
+    finally:
+        if should_close:
+            db.close()
+
+def obtener_versiones_datos(db: Session = None):
+    """
+    Obtiene la versión actual de cada conjunto de datos
+    
+    Returns:
+        Dict conjunto -> versión
+    """
+    # Crear sesión propia si no se proporciona una
+    if db is None:
+        db = SessionLocal()
+        should_close = True
+    else:
+        should_close = False
+
+    try:
+        return dict(db.execute(select(VersionDatos.conjunto, VersionDatos.version)).all())
+    finally:
+        if should_close:
+            db.close()
+
+def _refrescar_resumen_programacion(db: Session, años):
+    """
+    Reconstruye resumen_programacion para los años indicados
+
+    No confirma: se ejecuta dentro de la transacción de la carga, así el resumen
+    cambia en el mismo commit que las filas que resume.
+    """
+    años = sorted({int(año) for año in años})
+    if not años:
+        return
+    P = ProgramacionPresupuestal
+    claves = [P.año, P.unidad_ejecutora_id, P.meta_id, P.clasificador]
+    montos = list(COLUMNAS_MONTOS.values())
+    db.execute(delete(ResumenProgramacion).where(ResumenProgramacion.año.in_(años)))
+    db.execute(insert(ResumenProgramacion).from_select(
+        ['año', 'unidad_ejecutora_id', 'meta_id', 'clasificador', 'descripcion_clasificador', *montos, 'filas'],
+        select(
+            *claves,
+            func.max(P.descripcion_clasificador),
+            *[func.coalesce(func.sum(getattr(P, monto)), 0) for monto in montos],
+            func.count()
+        ).where(P.año.in_(años)).group_by(*claves)
+    ))
+
+def _refrescar_resumen_adquisiciones(db: Session, años):
+    """Reconstruye resumen_adquisiciones para los años indicados (sin confirmar, como el de programación)"""
+    años = sorted({int(año) for año in años})
+    if not años:
+        return
+    A = Adquisicion
+    mes = extract('month', A.fecha_adjudicacion)
+    claves = [A.año, A.unidad_ejecutora_id, A.meta_id, A.estado, AdquisicionDetalle.tipo_servicio, mes]
+    db.execute(delete(ResumenAdquisiciones).where(ResumenAdquisiciones.año.in_(años)))
+    db.execute(insert(ResumenAdquisiciones).from_select(
+        ['año', 'unidad_ejecutora_id', 'meta_id', 'estado', 'tipo_servicio', 'mes',
+         'cantidad', 'monto_referencial', 'monto_adjudicado'],
+        select(
+            *claves,
+            func.count(),
+            func.coalesce(func.sum(A.monto_referencial), 0),
+            func.coalesce(func.sum(A.monto_adjudicado), 0)
+        ).outerjoin(AdquisicionDetalle, A.id == AdquisicionDetalle.adquisicion_id)
+        .where(A.año.in_(años)).group_by(*claves)
+    ))
+
+def reconstruir_resumenes(db: Session, solo_si_faltan: bool = False):
+    """
+    Reconstruye las tablas de resumen de todos los años
+
+    Args:
+        db: Sesión de base de datos
+        solo_si_faltan: Reconstruir solo si un resumen está vacío y su tabla no
+                        (bases cargadas antes de existir los resúmenes)
+
+    Returns:
+        True si se reconstruyó algún resumen
+    """
+    reconstruido = False
+    for resumen, hechos, refrescar, conjunto in (
+        (ResumenProgramacion, ProgramacionPresupuestal, _refrescar_resumen_programacion, CONJUNTO_PROGRAMACION),
+        (ResumenAdquisiciones, Adquisicion, _refrescar_resumen_adquisiciones, CONJUNTO_ADQUISICIONES),
+    ):
+        if solo_si_faltan and db.execute(select(exists().select_from(resumen))).scalar():
+            continue
+        años = db.execute(select(hechos.año).distinct()).scalars().all()
+        if años:
+            refrescar(db, años)
+            _incrementar_version(db, conjunto)
+            reconstruido = True
+    db.commit()
+    return reconstruido
+
+def _intercambiar_staging(db: Session, lote: str, año: int, modo: str = 'actualizar'):
+    """
+    Pasa un lote de staging a programacion_presupuestal en una sola transacción corta
+    
+    En modo 'actualizar' elimina las filas del año que ya no vienen en el lote,
+    actualiza las que cambiaron de huella e inserta las nuevas; en modo 'agregar'
+    solo inserta. Los lectores siguen viendo la versión anterior del año hasta el commit;
+    los intercambios de programación se ejecutan de a uno.
+    
+    Returns:
+        Dict con los conteos nuevos/actualizados/sin_cambios/eliminados
+    """
+    P = ProgramacionPresupuestal
+    S = ProgramacionStaging
+    ahora = datetime.utcnow()
+    # Primero se incrementa la versión: el bloqueo de esa fila ordena los intercambios
+    # concurrentes (dos trabajos del mismo año), así cada uno ve lo que confirmó el anterior
+    # y ni el resumen ni las filas nuevas se duplican
+    _incrementar_version(db, CONJUNTO_PROGRAMACION)
+    claves_lote = select(S.clave).where(S.lote == lote)
+    total = db.execute(select(func.count()).select_from(S).where(S.lote == lote)).scalar()
+    
+    eliminados = actualizados = 0
+    if modo != 'agregar':
+        # Filas sin clave (cargas anteriores), con clave repetida o ausentes del lote
+        primeras = select(func.min(P.id)).where(P.año == año, P.clave.isnot(None)).group_by(P.clave)
+        condicion = (P.año == año) & or_(P.clave.is_(None), P.clave.not_in(claves_lote), P.id.not_in(primeras))
+        _registrar_eliminados(db, P, condicion, ahora)
+        eliminados = db.execute(
+            delete(P).where(condicion).execution_options(synchronize_session=False)
+        ).rowcount
+        
+        campos = list(COLUMNAS_MONTOS.values()) + ['huella']
+        actualizados = db.execute(
+            update(P)
+            .where(S.lote == lote, P.año == año, P.clave == S.clave, P.huella.is_distinct_from(S.huella))
+            .values({**{campo: getattr(S, campo) for campo in campos}, 'updated_at': ahora})
+            .execution_options(synchronize_session=False)
+        ).rowcount
+    
+    columnas = ['año', 'unidad_ejecutora_id', 'meta_id', 'clasificador', 'descripcion_clasificador',
+                *COLUMNAS_MONTOS.values(), 'clave', 'huella']
+    seleccion = select(
+        *[getattr(S, columna) for columna in columnas],
+        literal(ahora, DateTime).label('created_at'),
+        literal(ahora, DateTime).label('updated_at'),
+    ).where(S.lote == lote)
+    if modo != 'agregar':
+        seleccion = seleccion.where(~exists().where(P.año == año, P.clave == S.clave))
+    nuevos = db.execute(
+        insert(P).from_select(columnas + ['created_at', 'updated_at'], seleccion)
+    ).rowcount
+    
+    _refrescar_resumen_programacion(db, [año])
+    db.commit()
+    
+    return {
+        'nuevos': nuevos,
+        'actualizados': actualizados,
+        'sin_cambios': total - nuevos - actualizados,
+        'eliminados': eliminados,
+    }
+
+# Cambiar al modificar _parsear_programacion, para no reutilizar parseos antiguos del cache
+VERSION_PARSEO_PROGRAMACION = 1
+
+def _parsear_bloques(bloques):
+    """Clasifica bloques consecutivos de la hoja arrastrando el contexto UE/Meta entre ellos"""
+    contexto = {}
+    for bloque in bloques:
+        registros, ues, metas = _parsear_programacion(bloque, contexto)
+        yield registros, ues, metas, len(bloque)
+
+def _leer_contenido(archivo) -> bytes:
+    """Bytes de un archivo subido, un buffer o una ruta"""
+    if hasattr(archivo, 'getvalue'):
+        return archivo.getvalue()
+    if hasattr(archivo, 'read'):
+        contenido = archivo.read()
+        archivo.seek(0)
+        return contenido
+    with open(archivo, 'rb') as f:
+        return f.read()
+
+def _parseos_desde_cache(ruta: str):
+    """Parseos guardados de un archivo ya cargado; las dimensiones viajan con el primer bloque"""
+    ues = leer_tabla_cache(ruta, 'ues')
+    metas = leer_tabla_cache(ruta, 'metas')
+    dimensiones = (ues['codigo'].tolist(), metas)
+    for registros in iterar_tabla_cache(ruta, 'registros', TAMAÑO_BLOQUE):
+        yield (registros, *dimensiones, len(registros))
+        dimensiones = ([], metas.iloc[0:0])
+    if dimensiones[0] or len(dimensiones[1]):
+        # Archivo sin filas de detalle: solo aporta UEs y metas
+        yield (leer_tabla_cache(ruta, 'registros'), *dimensiones, 0)
+
+def _parseos_guardando_en_cache(contenido: bytes, clave: str):
+    """Parsea el archivo por bloques y guarda cada bloque en el cache a medida que avanza"""
+    escritor = EscritorCache(clave)
+    try:
+        for registros, ues, metas, filas_leidas in _parsear_bloques(
+            iterar_bloques_excel(io.BytesIO(contenido), filas_omitidas=4)
+        ):
+            escritor.agregar('registros', registros)
+            escritor.agregar('ues', pd.DataFrame({'codigo': pd.Series(ues, dtype=object)}))
+            escritor.agregar('metas', metas)
+            yield registros, ues, metas, filas_leidas
+    except BaseException:
+        escritor.descartar()
+        raise
+    escritor.confirmar()
+
+def _parseos_programacion(contenido: bytes):
+    """
+    Parseos de un archivo de programación: del cache de cargas si el mismo contenido
+    ya se subió antes, o leyendo el Excel por bloques
+    
+    Returns:
+        Tuple (parseos: iterable como el de _parsear_bloques, filas_totales estimadas)
+    """
+    clave = clave_cache(f'programacion-v{VERSION_PARSEO_PROGRAMACION}', contenido)
+    ruta = buscar_en_cache(clave)
+    if ruta:
+        return _parseos_desde_cache(ruta), contar_filas_cache(ruta, 'registros')
+    filas_totales = contar_filas_excel(io.BytesIO(contenido), filas_omitidas=4)
+    return _parseos_guardando_en_cache(contenido, clave), filas_totales
+
+def _escribir_programacion(db: Session, parseos, año: int, modo: str = 'actualizar', dimensiones=None,
+                           progreso=None, filas_totales: int = None):
+    """
+    Carga en staging los bloques parseados de un año y luego los intercambia con la tabla final
+    
+    Cada bloque se escribe y confirma apenas se parsea, así la memoria no depende del
+    tamaño del archivo; la carga masiva ocurre fuera de la transacción que toca
+    programacion_presupuestal, que solo queda bloqueada durante el intercambio.
+    
+    Args:
+        parseos: Iterable de tuplas (registros, ues, metas, filas_leidas) de _parsear_bloques
+        dimensiones: Tuple (ue_ids, meta_ids) de _cargar_dimensiones, compartido entre archivos
+        progreso: Función opcional progreso(filas_procesadas, filas_totales) por bloque
+        filas_totales: Filas estimadas de la hoja, para el reporte de avance
+    
+    Returns:
+        Dict con los conteos nuevos/actualizados/sin_cambios/eliminados
+    """
+    ue_ids, meta_ids = dimensiones if dimensiones else _cargar_dimensiones(db)
+    lote = uuid.uuid4().hex
+    ocurrencias = {}
+    filas_procesadas = 0
+    try:
+        for registros, ues, metas, filas_leidas in parseos:
+            _asegurar_dimensiones(db, ue_ids, meta_ids, ues, metas)
+            
+            registros = registros.copy()
+            registros['clave'], registros['huella'] = _calcular_huellas(registros, ocurrencias)
+            registros.insert(0, 'año', año)
+            registros.insert(1, 'unidad_ejecutora_id', registros.pop('ue_codigo').map(ue_ids))
+            registros.insert(2, 'meta_id', registros.pop('meta_codigo').map(meta_ids).astype('Int64'))
+            
+            _insertar_en_bloque(db, ProgramacionStaging.__table__, registros.assign(lote=lote))
+            db.commit()
+            
+            filas_procesadas += filas_leidas
+            if progreso:
+                progreso(filas_procesadas, max(filas_totales or 0, filas_procesadas))
+        return _intercambiar_staging(db, lote, año, modo)
+    finally:
+        # Un error de la limpieza no debe ocultar el de la carga; las filas que queden
+        # en staging son de un lote que ya nadie lee
+        try:
+            db.rollback()
+            db.execute(delete(ProgramacionStaging).where(ProgramacionStaging.lote == lote))
+            db.commit()
+        except Exception:
+            logger.exception("No se pudo limpiar el lote %s de programacion_presupuestal_staging", lote)
+
+def _mensaje_importacion(conteos: dict, año: int, modo: str):
+    """Arma el resumen de una carga de programación"""
+    if modo == 'agregar':
+        return f"Se cargaron {conteos['nuevos']} registros exitosamente para el año {año}"
+    return (
+        f"Año {año}: {conteos['nuevos']} registros nuevos, {conteos['actualizados']} actualizados, "
+        f"{conteos['sin_cambios']} sin cambios y {conteos['eliminados']} eliminados"
+    )
+
+def procesar_archivo_programacion(db: Session, archivo, año: int, modo: str = 'actualizar', progreso=None):
     """
     Procesa un archivo Excel de programación anual y carga los datos en la BD
     
+    El archivo se lee por bloques (ver lectores_excel), de modo que la memoria usada
+    no crece con el tamaño del archivo; si el mismo archivo ya se cargó antes, los
+    bloques salen del cache de cargas (ver cache_cargas) sin volver a leer el Excel.
+    
     Args:
         db: Sesión de base de datos
         archivo: Archivo Excel cargado
         año: Año de la programación
+        modo: 'actualizar' reemplaza el año aplicando solo las diferencias;
+              'agregar' inserta todas las filas sin tocar las existentes
+        progreso: Función opcional progreso(filas_procesadas, filas_totales)
+    
+    Returns:
+        Tuple (éxito: bool, mensaje: str)
+    """
+    try:
+        parseos, filas_totales = _parseos_programacion(_leer_contenido(archivo))
+        conteos = _escribir_programacion(db, parseos, año, modo, progreso=progreso, filas_totales=filas_totales)
+        return True, _mensaje_importacion(conteos, año, modo)
+        
+    except Exception as e:
+        db.rollback()
+        return False, f"Error al procesar archivo: {str(e)}"
+
+def _parsear_archivo_programacion(contenido: bytes):
+    """
+    Parsea un archivo de programación al cache de cargas; se ejecuta en un proceso del pool
+    
+    Los bloques van al Parquet de la entrada a medida que se leen y no vuelven al proceso
+    principal, que después los recorre con _parseos_desde_cache: la memoria de una carga
+    de varios archivos no depende de su tamaño.
+    
+    Returns:
+        Tuple (clave de la entrada en el cache, filas de registros a escribir)
+    """
+    clave = clave_cache(f'programacion-v{VERSION_PARSEO_PROGRAMACION}', contenido)
+    if not buscar_en_cache(clave):
+        for _ in _parseos_guardando_en_cache(contenido, clave):
+            pass
+    ruta = buscar_en_cache(clave)
+    return clave, contar_filas_cache(ruta, 'registros') if ruta else None
+
+def _parseos_archivo_parseado(clave: str, contenido: bytes):
+    """Parseos de un archivo ya parseado por el pool; si su entrada fue desalojada, se vuelve a leer"""
+    ruta = buscar_en_cache(clave)
+    if ruta:
+        return _parseos_desde_cache(ruta)
+    parseos, _ = _parseos_programacion(contenido)
+    return parseos
+
+def procesar_archivos_programacion(db: Session, archivos, modo: str = 'actualizar', progreso=None,
+                                   max_procesos: int = None):
+    """
+    Procesa varios archivos de programación: el parseo corre en paralelo en un pool de
+    procesos y la escritura en la BD la hace un único escritor, en el orden recibido
+    (así una corrección cargada después del original prevalece sobre él)
+    
+    Un archivo que falla no detiene a los demás: el mensaje trae el resultado de cada uno.
+    
+    Args:
+        db: Sesión de base de datos
+        archivos: Lista de tuplas (nombre, contenido: bytes, año)
+        modo: 'actualizar' o 'agregar' (ver procesar_archivo_programacion)
+        progreso: Función opcional progreso(filas_procesadas, filas_totales) sobre todos los archivos
+        max_procesos: Procesos de parseo (por defecto IMPORTACION_PROCESOS o núcleos disponibles)
+    
+    Returns:
+        Tuple (éxito: bool, mensaje: str); éxito solo si todos los archivos se cargaron
+    """
+    if len(archivos) == 1:
+        nombre, contenido, año = archivos[0]
+        return procesar_archivo_programacion(db, io.BytesIO(contenido), año, modo, progreso)
+    
+    max_procesos = max_procesos or int(os.getenv('IMPORTACION_PROCESOS', '0')) or os.cpu_count() or 1
+    
+    # spawn evita heredar por fork los hilos del servidor de Streamlit
+    with ProcessPoolExecutor(max_workers=min(max_procesos, len(archivos)),
+                             mp_context=multiprocessing.get_context('spawn')) as pool:
+        futuros = [pool.submit(_parsear_archivo_programacion, contenido) for _, contenido, _ in archivos]
+        dimensiones = _cargar_dimensiones(db)
+        
+        # Los archivos se parsean en paralelo, así esperar a todos cuesta poco más que
+        # esperar al primero, y el avance se reporta desde el inicio sobre el total; cada
+        # resultado es solo la clave del cache y un conteo
+        resultados = []
+        for futuro in futuros:
+            try:
+                resultados.append(futuro.result())
+            except Exception as e:
+                resultados.append(e)
+    
+    filas_totales = sum(
+        resultado[1] or 0 for resultado in resultados if not isinstance(resultado, Exception)
+    )
+    mensajes = []
+    fallidos = 0
+    acumulado = 0
+    
+    for (nombre, contenido, año), resultado in zip(archivos, resultados):
+        def progreso_archivo(procesadas, totales, base=acumulado):
+            if progreso:
+                progreso(base + procesadas, max(filas_totales, base + totales))
+        
+        try:
+            if isinstance(resultado, Exception):
+                raise resultado
+            clave, filas_archivo = resultado
+            parseos = _parseos_archivo_parseado(clave, contenido)
+            conteos = _escribir_programacion(db, parseos, año, modo, dimensiones, progreso_archivo, filas_archivo)
+            mensajes.append(f"{nombre}: {_mensaje_importacion(conteos, año, modo)}")
+        except Exception as e:
+            db.rollback()
+            # El rollback pudo deshacer UE o Metas recién creadas por este archivo
+            dimensiones = _cargar_dimensiones(db)
+            fallidos += 1
+            mensajes.append(f"{nombre}: Error al procesar archivo: {str(e)}")
+        if not isinstance(resultado, Exception):
+            acumulado += resultado[1] or 0
+    
+    if fallidos:
+        mensajes.append(f"{fallidos} de {len(archivos)} archivos no se cargaron")
+    return fallidos == 0, "\n".join(mensajes)
+
+# Hojas de la plantilla de adquisiciones (ver crear_plantilla_adquisiciones.py)
+HOJA_ADQUISICIONES = 'Adquisiciones'
+HOJA_DETALLE = 'Detalle_Adquisicion'
+HOJA_PROCESO = 'Proceso_Timeline'
+HOJA_VALORES_PERMITIDOS = 'Valores_Permitidos'
+
+# Columnas de cada hoja -> campos del modelo
+COLUMNAS_ADQUISICION = {
+    'Año': 'año',
+    'Código': 'codigo_adquisicion',
+    'Descripción': 'descripcion',
+    'Tipo_Proceso': 'tipo_proceso',
+    'Estado': 'estado',
+    'Monto_Referencial': 'monto_referencial',
+    'Cantidad': 'cantidad',
+    'Monto_Adjudicado': 'monto_adjudicado',
+    'Proveedor': 'proveedor',
+    'Fecha_Convocatoria': 'fecha_convocatoria',
+    'Fecha_Adjudicacion': 'fecha_adjudicacion',
+}
+COLUMNAS_DETALLE = {
+    'PIM_Asignado': 'pim_asignado',
+    'Requerimientos_Total': 'requerimientos_total',
+    'Requerimientos_Adquiridos': 'requerimientos_adquiridos',
+    'Unidad_Responsable': 'unidad_responsable',
+}
+COLUMNAS_PROCESO = {
+    'Orden': 'orden',
+    'Hito': 'hito',
+    'Tipo_Flujo': 'tipo_flujo',
+    'Responsable_Area': 'responsable_area',
+    'Responsable_Correo': 'responsable_correo',
+    'Fecha_Inicio': 'fecha_inicio',
+    'Fecha_Fin': 'fecha_fin',
+    'Dias_Transcurridos': 'dias_transcurridos',
+    'Comentarios': 'comentarios',
+}
+
+# Columnas obligatorias, numéricas y de fecha de cada hoja
+OBLIGATORIAS_PLANTILLA = {
+    HOJA_ADQUISICIONES: ['Año', 'UE', 'Descripción', 'Estado', 'Monto_Referencial'],
+    HOJA_DETALLE: ['Código_Adquisicion'],
+    HOJA_PROCESO: ['Código_Adquisicion', 'Orden', 'Hito', 'Tipo_Flujo', 'Responsable_Area', 'Fecha_Inicio'],
+}
+NUMERICAS_PLANTILLA = ['Año', 'Cantidad', 'Monto_Referencial', 'Monto_Adjudicado', 'PIM_Asignado',
+                       'Requerimientos_Total', 'Requerimientos_Adquiridos', 'Orden', 'Dias_Transcurridos']
+FECHAS_PLANTILLA = ['Fecha_Convocatoria', 'Fecha_Adjudicacion', 'Fecha_Inicio', 'Fecha_Fin']
+
+# Se usan si la plantilla no trae la hoja Valores_Permitidos
+VALORES_PERMITIDOS = {
+    'Estado': ['EN PROCESO', 'CULMINADO', 'CANCELADO', 'HISTORICO', 'NO INICIADO'],
+    'Tipo_Servicio': ['BIEN', 'SERVICIO'],
+    'Tipo_Flujo': ['OTIN', 'OTA'],
+}
+
+# Errores de validación listados en el mensaje
+MAX_ERRORES_PLANTILLA = 20
+
+def _registrar_errores(errores: list, hoja: str, mascara: pd.Series, texto: str, valores: pd.Series = None):
+    """Agrega un error por fila marcada en mascara; texto puede usar {valor}"""
+    for fila in mascara.index[mascara.to_numpy()]:
+        valor = valores[fila] if valores is not None else None
+        errores.append(f"{hoja} fila {fila}: {texto.format(valor=valor)}")
+
+def _normalizar_hoja(df: pd.DataFrame, hoja: str, errores: list):
+    """Limpia textos y convierte en bloque las columnas numéricas y de fecha de una hoja de la plantilla"""
+    if df.columns.empty:
+        # Hoja opcional ausente
+        return df
+    
+    df = df.copy()
+    df.columns = [str(columna).strip() for columna in df.columns]
+    
+    for columna in df.columns[[tipo.kind == 'O' for tipo in df.dtypes]]:
+        df[columna] = df[columna].map(lambda v: v.strip() or None if isinstance(v, str) else v)
+    
+    for columna in OBLIGATORIAS_PLANTILLA.get(hoja, []):
+        if columna not in df.columns:
+            errores.append(f"{hoja}: falta la columna {columna}")
+        else:
+            _registrar_errores(errores, hoja, df[columna].isna(), f"{columna} es obligatorio")
+    
+    for columna in df.columns.intersection(NUMERICAS_PLANTILLA):
+        valores = pd.to_numeric(df[columna], errors='coerce')
+        _registrar_errores(errores, hoja, df[columna].notna() & valores.isna(),
+                           f"{columna} '{{valor}}' no es un número", df[columna])
+        df[columna] = valores
+    
+    for columna in df.columns.intersection(FECHAS_PLANTILLA):
+        valores = pd.to_datetime(df[columna], errors='coerce', dayfirst=True, format='mixed')
+        _registrar_errores(errores, hoja, df[columna].notna() & valores.isna(),
+                           f"{columna} '{{valor}}' no es una fecha", df[columna])
+        df[columna] = valores
+    
+    return df
+
+def _leer_valores_permitidos(hoja: pd.DataFrame):
+    """Valores permitidos por campo según la hoja Valores_Permitidos ("A, B, C" por fila)"""
+    permitidos = dict(VALORES_PERMITIDOS)
+    if len(hoja) == 0 or not {'Campo', 'Valores Permitidos'} <= set(hoja.columns):
+        return permitidos
+    
+    valores = hoja.assign(valor=hoja['Valores Permitidos'].astype(str).str.split(',')).explode('valor')
+    valores['valor'] = valores['valor'].str.strip().str.upper()
+    permitidos.update(valores.groupby(valores['Campo'].astype(str).str.strip())['valor'].agg(list).to_dict())
+    return permitidos
+
+def _validar_plantilla(hojas: dict, permitidos: dict, errores: list):
+    """Valida en bloque enumeraciones, códigos duplicados y referencias entre hojas"""
+    for hoja, df in hojas.items():
+        for campo, valores in permitidos.items():
+            if campo in df.columns:
+                df[campo] = df[campo].astype('string').str.upper().astype(object)
+                _registrar_errores(errores, hoja, df[campo].notna() & ~df[campo].isin(valores),
+                                   f"{campo} '{{valor}}' no permitido (use: {', '.join(valores)})", df[campo])
+    
+    adquisiciones = hojas[HOJA_ADQUISICIONES]
+    codigos = adquisiciones.get('Código', pd.Series(dtype=object))
+    _registrar_errores(errores, HOJA_ADQUISICIONES, codigos.notna() & codigos.duplicated(keep=False),
+                       "Código '{valor}' repetido", codigos)
+    
+    detalle = hojas[HOJA_DETALLE]
+    if 'Código_Adquisicion' in detalle.columns:
+        _registrar_errores(errores, HOJA_DETALLE,
+                           detalle['Código_Adquisicion'].notna() & detalle['Código_Adquisicion'].duplicated(keep=False),
+                           "Código_Adquisicion '{valor}' repetido", detalle['Código_Adquisicion'])
+    
+    for hoja in (HOJA_DETALLE, HOJA_PROCESO):
+        if 'Código_Adquisicion' in hojas[hoja].columns:
+            referencias = hojas[hoja]['Código_Adquisicion']
+            _registrar_errores(errores, hoja, referencias.notna() & ~referencias.isin(codigos.dropna()),
+                               "Código_Adquisicion '{valor}' no está en la hoja Adquisiciones", referencias)
+
+def procesar_archivo_adquisiciones(db: Session, archivo, progreso=None):
+    """
+    Importa la plantilla de adquisiciones (Plantilla_Adquisiciones.xlsx) completa
+    
+    Lee todas las hojas, valida en bloque los valores contra Valores_Permitidos y,
+    si no hay errores, inserta Adquisiciones, Detalle y Proceso en pocas sentencias
+    dentro de una sola transacción. Las adquisiciones cuyo Código ya existe en la BD
+    se reemplazan junto con su detalle y su timeline, así la plantilla se puede volver
+    a cargar corregida.
+    
+    Args:
+        db: Sesión de base de datos
+        archivo: Archivo Excel cargado
+        progreso: Función opcional progreso(filas_procesadas, filas_totales)
     
     Returns:
         Tuple (éxito: bool, mensaje: str)
     """
     try:
-        df = pd.read_excel(archivo, skiprows=4)
+        nombres = nombres_hojas_excel(archivo)
+        if HOJA_ADQUISICIONES not in nombres:
+            return False, f"La plantilla no tiene la hoja {HOJA_ADQUISICIONES}"
         
-        df.columns = ['Descripcion', 'PIM', 'CERTIFICADO', 'PIM_POR_CERTIFICAR', 'COMPROMISO_ANUAL', 
-                      'DEVENGADO_ACUMULADO', 'COMPROMISO_ANUAL_POR_DEVENGAR', 'PIM_POR_DEVENGAR',
-                      'NOV_Programacion', 'NOV_Ejecucion', 'NOV_Pendiente', 'DIC_Prog', 
-                      'TOTAL_ANUAL', 'SALDO']
+        errores = []
+        hojas = {
+            hoja: _normalizar_hoja(leer_hoja_excel(archivo, hoja) if hoja in nombres else pd.DataFrame(), hoja, errores)
+            for hoja in (HOJA_ADQUISICIONES, HOJA_DETALLE, HOJA_PROCESO)
+        }
+        permitidos = _leer_valores_permitidos(
+            leer_hoja_excel(archivo, HOJA_VALORES_PERMITIDOS) if HOJA_VALORES_PERMITIDOS in nombres else pd.DataFrame()
+        )
+        _validar_plantilla(hojas, permitidos, errores)
+        if errores:
+            listado = "\n".join(errores[:MAX_ERRORES_PLANTILLA])
+            if len(errores) > MAX_ERRORES_PLANTILLA:
+                listado += f"\n... y {len(errores) - MAX_ERRORES_PLANTILLA} más"
+            return False, f"La plantilla tiene {len(errores)} errores; no se importó ninguna fila:\n{listado}"
         
-        df = df[df['Descripcion'] != 'ddnntt / meta / clasificador'].copy()
-        df = df.dropna(subset=['Descripcion'])
+        adquisiciones = hojas[HOJA_ADQUISICIONES].reindex(
+            columns=[*COLUMNAS_ADQUISICION, 'UE', 'Meta', 'Tipo_Servicio']
+        )
+        detalle_hoja = hojas[HOJA_DETALLE].reindex(columns=['Código_Adquisicion', *COLUMNAS_DETALLE])
+        proceso_hoja = hojas[HOJA_PROCESO].reindex(columns=['Código_Adquisicion', *COLUMNAS_PROCESO])
+        filas_totales = len(adquisiciones) + len(detalle_hoja) + len(proceso_hoja)
         
-        ue_actual = None
-        meta_actual = None
+        # UE y Meta se resuelven con un solo diccionario cargado al inicio
+        partes_meta = adquisiciones['Meta'].astype('string').str.extract(r'^\s*(.*?)(?:\s+-\s+(.*?))?\s*$')
+        meta_codigo = partes_meta[0].astype(object).where(partes_meta[0].notna(), None)
+        metas = pd.DataFrame({
+            'codigo': meta_codigo,
+            'descripcion': partes_meta[1].fillna(partes_meta[0]).astype(object),
+        }).dropna(subset=['codigo']).drop_duplicates(subset='codigo')
+        # Versión primero, como en _intercambiar_staging: ordena las importaciones concurrentes
+        _incrementar_version(db, CONJUNTO_ADQUISICIONES)
+        ue_ids, meta_ids = _cargar_dimensiones(db)
+        _asegurar_dimensiones(db, ue_ids, meta_ids, adquisiciones['UE'].tolist(), metas)
         
-        registros_creados = 0
+        # Reemplazar las adquisiciones que ya existen con el mismo código
+        codigos = adquisiciones['Código'].dropna().tolist()
+        existentes = select(Adquisicion.id).where(Adquisicion.codigo_adquisicion.in_(codigos)).scalar_subquery()
+        reemplazadas = db.execute(select(func.count()).where(Adquisicion.id.in_(existentes))).scalar()
+        # Años cuyo resumen cambia: los de la plantilla y los de las filas reemplazadas
+        años_afectados = set(adquisiciones['Año'].dropna().astype(int))
+        if reemplazadas:
+            años_afectados.update(db.execute(
+                select(Adquisicion.año).where(Adquisicion.id.in_(existentes)).distinct()
+            ).scalars())
+            _registrar_eliminados(db, Adquisicion, Adquisicion.id.in_(existentes))
+            db.execute(delete(AdquisicionProceso).where(AdquisicionProceso.adquisicion_id.in_(existentes)))
+            db.execute(delete(AdquisicionDetalle).where(AdquisicionDetalle.adquisicion_id.in_(existentes)))
+            db.execute(delete(Adquisicion).where(Adquisicion.codigo_adquisicion.in_(codigos)))
         
-        for idx, row in df.iterrows():
-            desc = str(row['Descripcion']).strip()
-            
-            # Check for UE row first (UE rows have empty PIM)
-            if re.match(r'^[A-Z]{3,5}$', desc):
-                ue = db.query(UnidadEjecutora).filter(UnidadEjecutora.codigo == desc).first()
-                if not ue:
-                    ue = UnidadEjecutora(codigo=desc, nombre=f"Unidad {desc}")
-                    db.add(ue)
-                    db.commit()
-                ue_actual = ue
-                meta_actual = None
-                continue
-            
-            # Check for Meta row (Meta rows also have empty PIM)
-            if desc.startswith('0') and ' - ' in desc:
-                partes = desc.split(' - ', 1)
-                codigo_meta = partes[0].strip()
-                descripcion_meta = partes[1].strip() if len(partes) > 1 else codigo_meta
-                
-                meta = db.query(MetaPresupuestal).filter(
-                    MetaPresupuestal.codigo == codigo_meta
-                ).first()
-                
-                if not meta:
-                    meta = MetaPresupuestal(codigo=codigo_meta, descripcion=descripcion_meta)
-                    db.add(meta)
-                    db.commit()
-                
-                meta_actual = meta
-                continue
-            
-            # Skip rows without PIM value (after checking for UE/Meta)
-            if pd.isna(row['PIM']):
-                continue
-            
-            # Skip if we don't have a UE context yet
-            if ue_actual is None:
-                continue
-            
-            clasificador = None
-            descripcion_clasificador = desc
-            if re.match(r'^\d+\.\s*\d+\.', desc):
-                partes_clas = desc.split(' ', 1)
-                clasificador = partes_clas[0].strip()
-                descripcion_clasificador = partes_clas[1].strip() if len(partes_clas) > 1 else desc
-            
-            prog = ProgramacionPresupuestal(
-                año=año,
-                unidad_ejecutora_id=ue_actual.id,
-                meta_id=meta_actual.id if meta_actual else None,
-                clasificador=clasificador,
-                descripcion_clasificador=descripcion_clasificador,
-                pim=float(row['PIM']) if not pd.isna(row['PIM']) else 0,
-                certificado=float(row['CERTIFICADO']) if not pd.isna(row['CERTIFICADO']) else 0,
-                pim_por_certificar=float(row['PIM_POR_CERTIFICAR']) if not pd.isna(row['PIM_POR_CERTIFICAR']) else 0,
-                compromiso_anual=float(row['COMPROMISO_ANUAL']) if not pd.isna(row['COMPROMISO_ANUAL']) else 0,
-                devengado_acumulado=float(row['DEVENGADO_ACUMULADO']) if not pd.isna(row['DEVENGADO_ACUMULADO']) else 0,
-                compromiso_por_devengar=float(row['COMPROMISO_ANUAL_POR_DEVENGAR']) if not pd.isna(row['COMPROMISO_ANUAL_POR_DEVENGAR']) else 0,
-                pim_por_devengar=float(row['PIM_POR_DEVENGAR']) if not pd.isna(row['PIM_POR_DEVENGAR']) else 0,
-                total_anual=float(row['TOTAL_ANUAL']) if not pd.isna(row['TOTAL_ANUAL']) else 0,
-                saldo=float(row['SALDO']) if not pd.isna(row['SALDO']) else 0
-            )
-            
-            db.add(prog)
-            registros_creados += 1
+        registros = adquisiciones[list(COLUMNAS_ADQUISICION)].rename(columns=COLUMNAS_ADQUISICION)
+        registros['año'] = registros['año'].astype('Int64')
+        registros['cantidad'] = registros['cantidad'].fillna(0).astype('Int64')
+        registros['monto_adjudicado'] = registros['monto_adjudicado'].fillna(0)
+        registros['unidad_ejecutora_id'] = adquisiciones['UE'].map(ue_ids)
+        registros['meta_id'] = meta_codigo.map(meta_ids).astype('Int64')
+        ids = pd.Series(_insertar_con_ids(db, Adquisicion.__table__, registros), index=adquisiciones.index)
+        if progreso:
+            progreso(len(adquisiciones), filas_totales)
         
+        # Detalle: tipo de servicio de la hoja principal más la hoja Detalle_Adquisicion
+        ids_por_codigo = dict(zip(adquisiciones['Código'], ids))
+        detalle_hoja = detalle_hoja.set_index('Código_Adquisicion')
+        tiene_detalle = adquisiciones['Tipo_Servicio'].notna() | adquisiciones['Código'].isin(detalle_hoja.index)
+        detalle = pd.DataFrame({
+            'adquisicion_id': ids[tiene_detalle],
+            'tipo_servicio': adquisiciones.loc[tiene_detalle, 'Tipo_Servicio'],
+        })
+        codigos_detalle = adquisiciones.loc[tiene_detalle, 'Código']
+        for columna, campo in COLUMNAS_DETALLE.items():
+            detalle[campo] = codigos_detalle.map(detalle_hoja[columna])
+        detalle['requerimientos_total'] = detalle['requerimientos_total'].fillna(1).astype('Int64')
+        detalle['requerimientos_adquiridos'] = detalle['requerimientos_adquiridos'].fillna(0).astype('Int64')
+        detalle['pim_asignado'] = detalle['pim_asignado'].fillna(registros.loc[tiene_detalle, 'monto_referencial'])
+        _insertar_en_bloque(db, AdquisicionDetalle.__table__, detalle)
+        
+        # Proceso: hitos enlazados por código; los días se calculan si no vienen
+        procesos = proceso_hoja[list(COLUMNAS_PROCESO)].rename(columns=COLUMNAS_PROCESO)
+        procesos.insert(0, 'adquisicion_id', proceso_hoja['Código_Adquisicion'].map(ids_por_codigo))
+        procesos['orden'] = procesos['orden'].astype('Int64')
+        procesos['fecha_inicio'] = pd.to_datetime(procesos['fecha_inicio'])
+        procesos['fecha_fin'] = pd.to_datetime(procesos['fecha_fin'])
+        procesos['dias_transcurridos'] = procesos['dias_transcurridos'].fillna(
+            (procesos['fecha_fin'] - procesos['fecha_inicio']).dt.days
+        ).fillna(0).astype('Int64')
+        _insertar_en_bloque(db, AdquisicionProceso.__table__, procesos)
+        
+        _refrescar_resumen_adquisiciones(db, años_afectados)
         db.commit()
-        return True, f"Se cargaron {registros_creados} registros exitosamente para el año {año}"
+        if progreso:
+            progreso(filas_totales, filas_totales)
         
+        mensaje = (
+            f"Se importaron {len(registros)} adquisiciones, {len(detalle)} detalles "
+            f"y {len(procesos)} hitos de proceso"
+        )
+        if reemplazadas:
+            mensaje += f" ({reemplazadas} adquisiciones existentes fueron reemplazadas)"
+        return True, mensaje
+    
     except Exception as e:
         db.rollback()
         return False, f"Error al procesar archivo: {str(e)}"
 
+def _leer_consulta_df(db: Session, consulta):
+    """
+    Ejecuta un select y arma el DataFrame por columnas, sin crear objetos por fila
+    
+    En PostgreSQL el resultado se transfiere con COPY ... TO STDOUT y se parsea con el
+    lector CSV de pandas; en otros motores se usa pd.read_sql.
+    """
+    bind = db.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return pd.read_sql(consulta, db.connection())
+    
+    # Tipos por columna: los textos no se infieren (el código de meta '0001' no es un número)
+    textos, fechas = {}, []
+    for columna in consulta.selected_columns:
+        try:
+            tipo = columna.type.python_type
+        except NotImplementedError:
+            continue
+        if tipo is str:
+            textos[columna.name] = object
+        elif tipo is datetime:
+            fechas.append(columna.name)
+    
+    # COPY no acepta parámetros: el driver los cita con mogrify, igual que en un execute,
+    # así los valores del filtro (el texto que escribe el usuario) nunca van tal cual al SQL
+    compilado = consulta.compile(dialect=bind.dialect, compile_kwargs={'render_postcompile': True})
+    buffer = io.StringIO()
+    cursor = db.connection().connection.cursor()
+    try:
+        sql = cursor.mogrify(str(compilado), compilado.params)
+        cursor.copy_expert(b"COPY (" + sql + b") TO STDOUT WITH (FORMAT csv, HEADER, NULL '\\N')", buffer)
+    finally:
+        cursor.close()
+    buffer.seek(0)
+    return pd.read_csv(buffer, dtype=textos, parse_dates=fechas, na_values=['\\N'], keep_default_na=False)
+
+def _porcentaje(parte: pd.Series, total: pd.Series):
+    """parte / total * 100 redondeado a 2 decimales, 0 donde el total no es positivo"""
+    return (parte / total.where(total > 0)).mul(100).round(2).fillna(0)
+
+def _texto_o(serie: pd.Series, defecto: str):
+    """Reemplaza nulos y textos vacíos por defecto"""
+    return serie.where(serie.notna() & (serie != ''), defecto)
+
+# Esquema de los DataFrames del tablero: los textos con pocos valores distintos, que se
+# repiten en miles de filas, se guardan como category (un código entero por fila) y los
+# enteros en el tipo más chico que los contiene
+CATEGORIAS_PROGRAMACION = ['UE', 'Meta_Codigo', 'Meta', 'Clasificador', 'Descripción']
+CATEGORIAS_ADQUISICIONES = ['UE', 'UE_Nombre', 'Meta_Codigo', 'Meta', 'Tipo_Proceso', 'Estado',
+                            'Proveedor', 'Tipo_Servicio']
+
+def _aplicar_esquema_df(df: pd.DataFrame, categorias, enteros):
+    """Convierte las columnas de categorias a category y reduce las de enteros"""
+    for columna in categorias:
+        df[columna] = df[columna].astype('category')
+    for columna in enteros:
+        df[columna] = pd.to_numeric(df[columna], downcast='integer')
+    return df
+
+def concatenar_con_categorias(df: pd.DataFrame, otro: pd.DataFrame):
+    """
+    pd.concat de dos DataFrames con las mismas columnas que conserva las columnas category
+    
+    pd.concat convierte a object una columna category si las categorías difieren; aquí
+    se agregan al final de las de df las que solo tiene otro (los códigos de df no se
+    recalculan) y se recodifica otro, que suele ser el más chico.
+    """
+    df, otro = df.copy(deep=False), otro.copy(deep=False)
+    for columna in df.columns:
+        if not isinstance(df[columna].dtype, pd.CategoricalDtype):
+            continue
+        categorias = df[columna].cat.categories
+        nuevas = pd.Index(otro[columna].dropna().unique()).difference(categorias)
+        if len(nuevas):
+            df[columna] = df[columna].cat.add_categories(nuevas)
+        otro[columna] = otro[columna].astype(df[columna].dtype)
+    return pd.concat([df, otro])
+
+def _consulta_programacion(*montos):
+    """Select de programación con UE, Meta y clasificador, más las columnas de montos pedidas"""
+    return select(
+        ProgramacionPresupuestal.año.label('Año'),
+        UnidadEjecutora.codigo.label('UE'),
+        MetaPresupuestal.codigo.label('Meta_Codigo'),
+        MetaPresupuestal.descripcion.label('Meta'),
+        ProgramacionPresupuestal.clasificador.label('Clasificador'),
+        ProgramacionPresupuestal.descripcion_clasificador.label('Descripción'),
+        *montos
+    ).join_from(ProgramacionPresupuestal, UnidadEjecutora).outerjoin(MetaPresupuestal)
+
+def _completar_programacion_df(df: pd.DataFrame):
+    """Valores por defecto y porcentaje de ejecución, por columnas"""
+    df['Meta_Codigo'] = _texto_o(df['Meta_Codigo'], '')
+    df['Meta'] = _texto_o(df['Meta'], 'Sin Meta')
+    df['Clasificador'] = _texto_o(df['Clasificador'], '')
+    df['Ejecución_%'] = _porcentaje(df['Certificado'], df['PIM'])
+    return _aplicar_esquema_df(df, CATEGORIAS_PROGRAMACION, ['Año'])
+
 def obtener_programacion_df(db: Session = None):
     """Obtiene todas las programaciones como DataFrame"""
     # Crear sesión propia si no se proporciona una
@@ -129,38 +1060,15 @@ def obtener_programacion_df(db: Session = None):
         should_close = False
     
     try:
-        programaciones = db.query(
-            ProgramacionPresupuestal.año.label('Año'),
-            UnidadEjecutora.codigo.label('UE'),
-            MetaPresupuestal.codigo.label('Meta_Codigo'),
-            MetaPresupuestal.descripcion.label('Meta'),
-            ProgramacionPresupuestal.clasificador.label('Clasificador'),
-            ProgramacionPresupuestal.descripcion_clasificador.label('Descripción'),
+        consulta = _consulta_programacion(
             ProgramacionPresupuestal.pim.label('PIM'),
             ProgramacionPresupuestal.certificado.label('Certificado'),
             ProgramacionPresupuestal.pim_por_certificar.label('PIM_Por_Certificar'),
             ProgramacionPresupuestal.devengado_acumulado.label('Devengado'),
             ProgramacionPresupuestal.total_anual.label('Total_Anual'),
             ProgramacionPresupuestal.saldo.label('Saldo')
-        ).join(UnidadEjecutora).outerjoin(MetaPresupuestal).all()
-        
-        df = pd.DataFrame([{
-            'Año': p.Año,
-            'UE': p.UE,
-            'Meta_Codigo': p.Meta_Codigo if p.Meta_Codigo else '',
-            'Meta': p.Meta if p.Meta else 'Sin Meta',
-            'Clasificador': p.Clasificador if p.Clasificador else '',
-            'Descripción': p.Descripción,
-            'PIM': p.PIM,
-            'Certificado': p.Certificado,
-            'PIM_Por_Certificar': p.PIM_Por_Certificar,
-            'Devengado': p.Devengado,
-            'Total_Anual': p.Total_Anual,
-            'Saldo': p.Saldo,
-            'Ejecución_%': round((p.Certificado / p.PIM * 100) if p.PIM > 0 else 0, 2)
-        } for p in programaciones])
-        
-        return df
+        )
+        return _completar_programacion_df(_leer_consulta_df(db, consulta))
     finally:
         if should_close:
             db.close()
@@ -175,13 +1083,7 @@ def obtener_programacion_completa_df(db: Session = None):
         should_close = False
 
     try:
-        programaciones = db.query(
-            ProgramacionPresupuestal.año.label('Año'),
-            UnidadEjecutora.codigo.label('UE'),
-            MetaPresupuestal.codigo.label('Meta_Codigo'),
-            MetaPresupuestal.descripcion.label('Meta'),
-            ProgramacionPresupuestal.clasificador.label('Clasificador'),
-            ProgramacionPresupuestal.descripcion_clasificador.label('Descripción'),
+        consulta = _consulta_programacion(
             ProgramacionPresupuestal.pim.label('PIM'),
             ProgramacionPresupuestal.certificado.label('Certificado'),
             ProgramacionPresupuestal.pim_por_certificar.label('PIM_Por_Certificar'),
@@ -191,28 +1093,50 @@ def obtener_programacion_completa_df(db: Session = None):
             ProgramacionPresupuestal.pim_por_devengar.label('PIM_Por_Devengar'),
             ProgramacionPresupuestal.total_anual.label('Total_Anual'),
             ProgramacionPresupuestal.saldo.label('Saldo')
-        ).join(UnidadEjecutora).outerjoin(MetaPresupuestal).all()
-
-        df = pd.DataFrame([{
-            'Año': p.Año,
-            'UE': p.UE,
-            'Meta_Codigo': p.Meta_Codigo if p.Meta_Codigo else '',
-            'Meta': p.Meta if p.Meta else 'Sin Meta',
-            'Clasificador': p.Clasificador if p.Clasificador else '',
-            'Descripción': p.Descripción,
-            'PIM': p.PIM,
-            'Certificado': p.Certificado,
-            'PIM_Por_Certificar': p.PIM_Por_Certificar,
-            'Compromiso_Anual': p.Compromiso_Anual,
-            'Devengado': p.Devengado,
-            'Compromiso_Por_Devengar': p.Compromiso_Por_Devengar,
-            'PIM_Por_Devengar': p.PIM_Por_Devengar,
-            'Total_Anual': p.Total_Anual,
-            'Saldo': p.Saldo,
-            'Ejecución_%': round((p.Certificado / p.PIM * 100) if p.PIM > 0 else 0, 2)
-        } for p in programaciones])
+        )
+        return _completar_programacion_df(_leer_consulta_df(db, consulta))
+    finally:
+        if should_close:
+            db.close()
 
-        return df
+def obtener_resumen_programacion_df(db: Session = None):
+    """
+    Obtiene la programación sumada por año, UE, meta y clasificador desde resumen_programacion
+    
+    Returns:
+        DataFrame con las columnas de obtener_programacion_completa_df más Filas
+        (registros de programación sumados en cada fila)
+    """
+    # Crear sesión propia si no se proporciona una
+    if db is None:
+        db = SessionLocal()
+        should_close = True
+    else:
+        should_close = False
+
+    try:
+        R = ResumenProgramacion
+        consulta = select(
+            R.año.label('Año'),
+            UnidadEjecutora.codigo.label('UE'),
+            MetaPresupuestal.codigo.label('Meta_Codigo'),
+            MetaPresupuestal.descripcion.label('Meta'),
+            R.clasificador.label('Clasificador'),
+            R.descripcion_clasificador.label('Descripción'),
+            R.pim.label('PIM'),
+            R.certificado.label('Certificado'),
+            R.pim_por_certificar.label('PIM_Por_Certificar'),
+            R.compromiso_anual.label('Compromiso_Anual'),
+            R.devengado_acumulado.label('Devengado'),
+            R.compromiso_por_devengar.label('Compromiso_Por_Devengar'),
+            R.pim_por_devengar.label('PIM_Por_Devengar'),
+            R.total_anual.label('Total_Anual'),
+            R.saldo.label('Saldo'),
+            R.filas.label('Filas')
+        ).join_from(R, UnidadEjecutora, R.unidad_ejecutora_id == UnidadEjecutora.id).outerjoin(
+            MetaPresupuestal, R.meta_id == MetaPresupuestal.id
+        )
+        return _completar_programacion_df(_leer_consulta_df(db, consulta))
     finally:
         if should_close:
             db.close()
@@ -241,8 +1165,206 @@ def eliminar_alerta(db: Session, alerta_id: int):
         return True
     return False
 
+@dataclass(frozen=True)
+class FiltroAdquisiciones:
+    """
+    Filtros del tablero de adquisiciones; un campo vacío no restringe
+    
+    Es inmutable y hasheable para poder usarlo como clave de cache.
+    
+    Attributes:
+        años: Años a incluir
+        ues: Códigos de Unidad Ejecutora
+        metas: Códigos de Meta ('' incluye las adquisiciones sin meta)
+        tipos: Tipos de servicio (BIEN, SERVICIO)
+        estados: Estados de la adquisición
+        texto: Texto a buscar en la descripción o el proveedor
+    """
+    años: tuple = ()
+    ues: tuple = ()
+    metas: tuple = ()
+    tipos: tuple = ()
+    estados: tuple = ()
+    texto: str = ''
+    
+    def __post_init__(self):
+        # Se aceptan listas (como las que entrega st.multiselect) y se guardan ordenadas
+        for campo in ('años', 'ues', 'metas', 'tipos', 'estados'):
+            object.__setattr__(self, campo, tuple(sorted(set(getattr(self, campo)))))
+        object.__setattr__(self, 'texto', (self.texto or '').strip())
+
+def _consulta_adquisiciones():
+    """Select de adquisiciones con UE, Meta y tipo de servicio, con las columnas del tablero"""
+    return select(
+        Adquisicion.año.label('Año'),
+        UnidadEjecutora.codigo.label('UE'),
+        UnidadEjecutora.nombre.label('UE_Nombre'),
+        MetaPresupuestal.codigo.label('Meta_Codigo'),
+        MetaPresupuestal.descripcion.label('Meta'),
+        Adquisicion.codigo_adquisicion.label('Código'),
+        Adquisicion.cantidad.label('Cantidad'),
+        Adquisicion.descripcion.label('Descripción'),
+        Adquisicion.tipo_proceso.label('Tipo_Proceso'),
+        Adquisicion.estado.label('Estado'),
+        Adquisicion.monto_referencial.label('Monto_Referencial'),
+        Adquisicion.monto_adjudicado.label('Monto_Adjudicado'),
+        Adquisicion.proveedor.label('Proveedor'),
+        Adquisicion.fecha_convocatoria.label('Fecha_Convocatoria'),
+        Adquisicion.fecha_adjudicacion.label('Fecha_Adjudicacion'),
+        AdquisicionDetalle.tipo_servicio.label('Tipo_Servicio')
+    ).join_from(Adquisicion, UnidadEjecutora).outerjoin(MetaPresupuestal).outerjoin(
+        AdquisicionDetalle, Adquisicion.id == AdquisicionDetalle.adquisicion_id
+    )
+
+def _aplicar_filtro_adquisiciones(consulta, filtro: FiltroAdquisiciones):
+    """Agrega al select las condiciones WHERE del filtro"""
+    if filtro is None:
+        return consulta
+    if filtro.años:
+        consulta = consulta.where(Adquisicion.año.in_(filtro.años))
+    if filtro.ues:
+        consulta = consulta.where(UnidadEjecutora.codigo.in_(filtro.ues))
+    if filtro.metas:
+        condicion = MetaPresupuestal.codigo.in_([m for m in filtro.metas if m])
+        if '' in filtro.metas:
+            condicion = or_(condicion, Adquisicion.meta_id.is_(None))
+        consulta = consulta.where(condicion)
+    if filtro.tipos:
+        consulta = consulta.where(AdquisicionDetalle.tipo_servicio.in_(filtro.tipos))
+    if filtro.estados:
+        consulta = consulta.where(Adquisicion.estado.in_(filtro.estados))
+    if filtro.texto:
+        # El texto se busca literal, como en filtrar_adquisiciones_df: % y _ no son comodines
+        texto = filtro.texto.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        patron = f"%{texto}%"
+        consulta = consulta.where(or_(
+            Adquisicion.descripcion.ilike(patron, escape='\\'),
+            Adquisicion.proveedor.ilike(patron, escape='\\')
+        ))
+    return consulta
+
+def _completar_adquisiciones_df(df: pd.DataFrame):
+    """Valores por defecto y porcentaje de avance, por columnas"""
+    df['Meta_Codigo'] = _texto_o(df['Meta_Codigo'], '')
+    df['Meta'] = _texto_o(df['Meta'], 'Sin Meta')
+    df['Código'] = _texto_o(df['Código'], '')
+    df['Cantidad'] = df['Cantidad'].fillna(0).astype('int64')
+    df['Tipo_Proceso'] = _texto_o(df['Tipo_Proceso'], 'No especificado')
+    df['Proveedor'] = _texto_o(df['Proveedor'], 'Sin proveedor')
+    df['Fecha_Convocatoria'] = pd.to_datetime(df['Fecha_Convocatoria'])
+    df['Fecha_Adjudicacion'] = pd.to_datetime(df['Fecha_Adjudicacion'])
+    # Avance_% va antes de Tipo_Servicio, como en la tabla del tablero
+    df.insert(df.columns.get_loc('Tipo_Servicio'), 'Avance_%',
+              _porcentaje(df['Monto_Adjudicado'], df['Monto_Referencial']))
+    df['Tipo_Servicio'] = _texto_o(df['Tipo_Servicio'], 'No especificado')
+    return _aplicar_esquema_df(df, CATEGORIAS_ADQUISICIONES, ['Año', 'Cantidad'])
+
+def consultar_adquisiciones_df(filtro: FiltroAdquisiciones = None, db: Session = None):
+    """
+    Obtiene como DataFrame solo las adquisiciones que cumplen el filtro
+    
+    Los filtros se resuelven en el WHERE de la consulta, así solo se transfieren
+    las filas pedidas. El tablero no la usa para sus filtros: los resuelve en memoria
+    sobre la tabla completa en cache (ver indice_filtros), con el mismo resultado.
+    
+    Args:
+        filtro: FiltroAdquisiciones (None trae todas)
+        db: Sesión de base de datos (opcional)
+    
+    Returns:
+        DataFrame con las mismas columnas que obtener_adquisiciones_df
+    """
+    # Crear sesión propia si no se proporciona una
+    if db is None:
+        db = SessionLocal()
+        should_close = True
+    else:
+        should_close = False
+
+    try:
+        consulta = _aplicar_filtro_adquisiciones(_consulta_adquisiciones(), filtro)
+        return _completar_adquisiciones_df(_leer_consulta_df(db, consulta))
+    finally:
+        if should_close:
+            db.close()
+
 def obtener_adquisiciones_df(db: Session = None):
     """Obtiene todas las adquisiciones como DataFrame"""
+    return consultar_adquisiciones_df(None, db)
+
+def consultar_cambios_adquisiciones_df(desde: datetime = None, db: Session = None):
+    """
+    Obtiene las adquisiciones modificadas después de desde (todas si es None), para
+    actualizar incrementalmente un DataFrame en memoria
+    
+    Returns:
+        DataFrame con las columnas de obtener_adquisiciones_df más Actualizado_En,
+        indexado por el id de la adquisición
+    """
+    # Crear sesión propia si no se proporciona una
+    if db is None:
+        db = SessionLocal()
+        should_close = True
+    else:
+        should_close = False
+
+    try:
+        consulta = _consulta_adquisiciones().add_columns(
+            Adquisicion.id.label('Id'),
+            Adquisicion.updated_at.label('Actualizado_En')
+        )
+        if desde is not None:
+            consulta = consulta.where(Adquisicion.updated_at > desde)
+        df = _completar_adquisiciones_df(_leer_consulta_df(db, consulta))
+        df['Actualizado_En'] = pd.to_datetime(df['Actualizado_En'])
+        return df.set_index('Id')
+    finally:
+        if should_close:
+            db.close()
+
+def contar_adquisiciones(db: Session = None) -> int:
+    """Número de adquisiciones en la BD"""
+    # Crear sesión propia si no se proporciona una
+    if db is None:
+        db = SessionLocal()
+        should_close = True
+    else:
+        should_close = False
+
+    try:
+        return db.execute(select(func.count(Adquisicion.id))).scalar()
+    finally:
+        if should_close:
+            db.close()
+
+def filtrar_adquisiciones_df(df: pd.DataFrame, filtro: FiltroAdquisiciones):
+    """
+    Aplica el filtro a un DataFrame de adquisiciones ya cargado en memoria, con el
+    mismo criterio que _aplicar_filtro_adquisiciones en la consulta
+    """
+    if filtro is None:
+        return df.reset_index(drop=True)
+    mascara = pd.Series(True, index=df.index)
+    for campo, columna in (('años', 'Año'), ('ues', 'UE'), ('metas', 'Meta_Codigo'),
+                           ('tipos', 'Tipo_Servicio'), ('estados', 'Estado')):
+        valores = getattr(filtro, campo)
+        if valores:
+            mascara &= df[columna].isin(valores)
+    if filtro.texto:
+        mascara &= (
+            df['Descripción'].str.contains(filtro.texto, case=False, regex=False, na=False)
+            | df['Proveedor'].str.contains(filtro.texto, case=False, regex=False, na=False)
+        )
+    return df[mascara].reset_index(drop=True)
+
+def obtener_opciones_filtro_adquisiciones(db: Session = None):
+    """
+    Obtiene los valores disponibles para cada filtro del tablero sin cargar las adquisiciones
+    
+    Returns:
+        Dict con años, ues, metas (DataFrame codigo/descripcion, '' = sin meta),
+        tipos, estados y total de adquisiciones
+    """
     # Crear sesión propia si no se proporciona una
     if db is None:
         db = SessionLocal()
@@ -251,68 +1373,154 @@ def obtener_adquisiciones_df(db: Session = None):
         should_close = False
 
     try:
-        adquisiciones = db.query(
-            Adquisicion.año.label('Año'),
+        def distintos(columna, *joins):
+            consulta = select(columna).select_from(Adquisicion)
+            for join in joins:
+                consulta = consulta.outerjoin(join)
+            return [valor for valor in db.execute(consulta.distinct()).scalars() if valor is not None]
+
+        metas = pd.DataFrame(
+            db.execute(
+                select(MetaPresupuestal.codigo, MetaPresupuestal.descripcion)
+                .select_from(Adquisicion).outerjoin(MetaPresupuestal).distinct()
+            ).all(),
+            columns=['codigo', 'descripcion']
+        )
+        metas['codigo'] = _texto_o(metas['codigo'], '')
+        metas['descripcion'] = _texto_o(metas['descripcion'], 'Sin Meta')
+
+        return {
+            'años': sorted(distintos(Adquisicion.año)),
+            'ues': sorted(distintos(UnidadEjecutora.codigo, UnidadEjecutora)),
+            'metas': metas.drop_duplicates('codigo').sort_values('descripcion').reset_index(drop=True),
+            'tipos': sorted(distintos(AdquisicionDetalle.tipo_servicio, AdquisicionDetalle)),
+            'estados': sorted(distintos(Adquisicion.estado)),
+            'total': db.execute(select(func.count(Adquisicion.id))).scalar(),
+        }
+    finally:
+        if should_close:
+            db.close()
+
+def obtener_resumen_adquisiciones_df(filtro: FiltroAdquisiciones = None, db: Session = None):
+    """
+    Obtiene las filas de resumen_adquisiciones que cumplen el filtro, para los
+    indicadores y gráficos del tablero
+    
+    El texto del filtro no se aplica: el resumen no guarda descripciones ni proveedores.
+    
+    Args:
+        filtro: FiltroAdquisiciones (None trae todo el resumen)
+        db: Sesión de base de datos (opcional)
+    
+    Returns:
+        DataFrame con Año, UE, Meta_Codigo, Meta, Estado, Tipo_Servicio, Mes (NaN sin
+        fecha de adjudicación), Cantidad, Monto_Referencial y Monto_Adjudicado
+    """
+    # Crear sesión propia si no se proporciona una
+    if db is None:
+        db = SessionLocal()
+        should_close = True
+    else:
+        should_close = False
+
+    try:
+        R = ResumenAdquisiciones
+        consulta = select(
+            R.año.label('Año'),
             UnidadEjecutora.codigo.label('UE'),
-            UnidadEjecutora.nombre.label('UE_Nombre'),
             MetaPresupuestal.codigo.label('Meta_Codigo'),
             MetaPresupuestal.descripcion.label('Meta'),
-            Adquisicion.codigo_adquisicion.label('Código'),
-            Adquisicion.cantidad.label('Cantidad'),
-            Adquisicion.descripcion.label('Descripción'),
-            Adquisicion.tipo_proceso.label('Tipo_Proceso'),
-            Adquisicion.estado.label('Estado'),
-            Adquisicion.monto_referencial.label('Monto_Referencial'),
-            Adquisicion.monto_adjudicado.label('Monto_Adjudicado'),
-            Adquisicion.proveedor.label('Proveedor'),
-            Adquisicion.fecha_convocatoria.label('Fecha_Convocatoria'),
-            Adquisicion.fecha_adjudicacion.label('Fecha_Adjudicacion'),
-            AdquisicionDetalle.tipo_servicio.label('Tipo_Servicio')
-        ).join(UnidadEjecutora).outerjoin(MetaPresupuestal).outerjoin(
-            AdquisicionDetalle, Adquisicion.id == AdquisicionDetalle.adquisicion_id
-        ).all()
-
-        df = pd.DataFrame([{
-            'Año': a.Año,
-            'UE': a.UE,
-            'UE_Nombre': a.UE_Nombre,
-            'Meta_Codigo': a.Meta_Codigo if a.Meta_Codigo else '',
-            'Meta': a.Meta if a.Meta else 'Sin Meta',
-            'Código': a.Código if a.Código else '',
-            'Cantidad': a.Cantidad if a.Cantidad else 0,
-            'Descripción': a.Descripción,
-            'Tipo_Proceso': a.Tipo_Proceso if a.Tipo_Proceso else 'No especificado',
-            'Estado': a.Estado,
-            'Monto_Referencial': a.Monto_Referencial,
-            'Monto_Adjudicado': a.Monto_Adjudicado,
-            'Proveedor': a.Proveedor if a.Proveedor else 'Sin proveedor',
-            'Fecha_Convocatoria': a.Fecha_Convocatoria,
-            'Fecha_Adjudicacion': a.Fecha_Adjudicacion,
-            'Avance_%': round((a.Monto_Adjudicado / a.Monto_Referencial * 100) if a.Monto_Referencial > 0 else 0, 2),
-            'Tipo_Servicio': a.Tipo_Servicio if a.Tipo_Servicio else 'No especificado'
-        } for a in adquisiciones])
-
+            R.estado.label('Estado'),
+            R.tipo_servicio.label('Tipo_Servicio'),
+            R.mes.label('Mes'),
+            R.cantidad.label('Cantidad'),
+            R.monto_referencial.label('Monto_Referencial'),
+            R.monto_adjudicado.label('Monto_Adjudicado')
+        ).join_from(R, UnidadEjecutora, R.unidad_ejecutora_id == UnidadEjecutora.id).outerjoin(
+            MetaPresupuestal, R.meta_id == MetaPresupuestal.id
+        )
+        if filtro is not None:
+            if filtro.años:
+                consulta = consulta.where(R.año.in_(filtro.años))
+            if filtro.ues:
+                consulta = consulta.where(UnidadEjecutora.codigo.in_(filtro.ues))
+            if filtro.metas:
+                condicion = MetaPresupuestal.codigo.in_([m for m in filtro.metas if m])
+                if '' in filtro.metas:
+                    condicion = or_(condicion, R.meta_id.is_(None))
+                consulta = consulta.where(condicion)
+            if filtro.tipos:
+                consulta = consulta.where(R.tipo_servicio.in_(filtro.tipos))
+            if filtro.estados:
+                consulta = consulta.where(R.estado.in_(filtro.estados))
+        
+        df = _leer_consulta_df(db, consulta)
+        df['Meta_Codigo'] = _texto_o(df['Meta_Codigo'], '')
+        df['Meta'] = _texto_o(df['Meta'], 'Sin Meta')
+        df['Tipo_Servicio'] = _texto_o(df['Tipo_Servicio'], 'No especificado')
+        df['Cantidad'] = df['Cantidad'].astype('int64')
         return df
     finally:
         if should_close:
             db.close()
 
-def obtener_detalle_adquisicion(db: Session, codigo_adquisicion: str):
-    """Obtiene el detalle completo de una adquisición por su código"""
-    adq = db.query(Adquisicion).filter(Adquisicion.codigo_adquisicion == codigo_adquisicion).first()
-    if not adq:
-        return None
+def _tipo_fila(modelo):
+    """namedtuple con las columnas de un modelo: sus filas se entregan como valores inmutables"""
+    return namedtuple(f"{modelo.__name__}Fila", [c.key for c in modelo.__mapper__.column_attrs])
+
+_FilaAdquisicion = _tipo_fila(Adquisicion)
+_FilaDetalle = _tipo_fila(AdquisicionDetalle)
+_FilaProceso = _tipo_fila(AdquisicionProceso)
+
+def _a_fila(tipo, objeto):
+    return tipo(*(getattr(objeto, campo) for campo in tipo._fields))
+
+@dataclass(frozen=True)
+class DetalleAdquisicion:
+    """
+    Adquisición con su detalle y sus procesos, desligada de la sesión
     
-    detalle = db.query(AdquisicionDetalle).filter(AdquisicionDetalle.adquisicion_id == adq.id).first()
-    procesos = db.query(AdquisicionProceso).filter(
-        AdquisicionProceso.adquisicion_id == adq.id
-    ).order_by(AdquisicionProceso.orden).all()
+    Es inmutable, así se puede guardar en cache y compartir entre sesiones.
     
-    return {
-        'adquisicion': adq,
-        'detalle': detalle,
-        'procesos': procesos
-    }
+    Attributes:
+        adquisicion: Fila con las columnas de Adquisicion
+        detalle: Fila con las columnas de AdquisicionDetalle, o None si no tiene
+        procesos: Filas de AdquisicionProceso ordenadas por orden
+    """
+    adquisicion: tuple
+    detalle: tuple
+    procesos: tuple
+
+def obtener_detalle_adquisicion(codigo_adquisicion: str, db: Session = None):
+    """
+    Obtiene el detalle completo de una adquisición por su código
+    
+    El detalle y los procesos se traen en la misma consulta (joinedload).
+    
+    Returns:
+        DetalleAdquisicion o None si no existe
+    """
+    should_close = db is None
+    if db is None:
+        db = SessionLocal()
+    
+    try:
+        consulta = select(Adquisicion).options(
+            joinedload(Adquisicion.detalle),
+            joinedload(Adquisicion.procesos)
+        ).where(Adquisicion.codigo_adquisicion == codigo_adquisicion)
+        adq = db.execute(consulta).unique().scalars().first()
+        if not adq:
+            return None
+        
+        return DetalleAdquisicion(
+            adquisicion=_a_fila(_FilaAdquisicion, adq),
+            detalle=_a_fila(_FilaDetalle, adq.detalle) if adq.detalle else None,
+            procesos=tuple(_a_fila(_FilaProceso, p) for p in adq.procesos)
+        )
+    finally:
+        if should_close:
+            db.close()
 
 def obtener_procesos_df(db: Session, adquisicion_id: int):
     """Obtiene los procesos de una adquisición como DataFrame para visualización"""
@@ -0,0 +1,82 @@
+"""
+Índice de bitmaps para filtrar las adquisiciones en memoria
+Por cada valor distinto de Año, UE, Meta, Tipo_Servicio y Estado se guarda un bitmap
+empaquetado (un bit por fila). Una selección de filtros se resuelve con OR de los
+bitmaps de los valores elegidos en cada dimensión y AND entre dimensiones, sobre
+arreglos ocho veces más chicos que las filas, y termina en un solo arreglo de
+posiciones: no se crean máscaras ni copias intermedias del DataFrame.
+"""
+import numpy as np
+import pandas as pd
+from cubo_adquisiciones import DIMENSIONES
+from db_operations import FiltroAdquisiciones, filtrar_adquisiciones_df
+
+class IndiceFiltros:
+    """
+    Bitmaps de un DataFrame de adquisiciones (el de obtener_adquisiciones_df)
+
+    El índice guarda el DataFrame con el que se armó; ninguno de los dos se modifica.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self.filas = len(df)
+        self._bitmaps = {}  # campo de FiltroAdquisiciones -> {valor: bitmap empaquetado}
+        for columna, campo in DIMENSIONES.items():
+            categorias = pd.Categorical(df[columna])
+            self._bitmaps[campo] = dict(zip(
+                categorias.categories.tolist(), self._armar_bitmaps(categorias.codes, len(categorias.categories))
+            ))
+
+    def _armar_bitmaps(self, codigos: np.ndarray, cantidad: int):
+        """
+        Bitmaps empaquetados de los códigos 0..cantidad-1 en una sola pasada sobre las filas
+
+        Las filas se ordenan por código (los nulos, -1, quedan al inicio y se descartan);
+        así los bits que caen en un mismo byte de un mismo bitmap quedan contiguos y se
+        suman de una vez con reduceat, en lugar de comparar la columna con cada valor.
+        """
+        bytes_por_bitmap = (self.filas + 7) // 8
+        bitmaps = np.zeros((cantidad, bytes_por_bitmap), dtype=np.uint8)
+        posiciones = np.argsort(codigos, kind='stable')[np.count_nonzero(codigos < 0):]
+        if len(posiciones):
+            celdas = codigos[posiciones].astype(np.int64) * bytes_por_bitmap + (posiciones >> 3)
+            bits = (0x80 >> (posiciones & 7)).astype(np.uint8)
+            inicios = np.flatnonzero(np.r_[True, celdas[1:] != celdas[:-1]])
+            bitmaps.reshape(-1)[celdas[inicios]] = np.add.reduceat(bits, inicios)
+        return list(bitmaps)
+
+    def tamaño_en_memoria(self) -> int:
+        """Bytes de los bitmaps; el DataFrame es el de la tabla completa y no se cuenta aquí"""
+        return sum(bitmap.nbytes for bitmaps in self._bitmaps.values() for bitmap in bitmaps.values())
+
+    def posiciones(self, filtro: FiltroAdquisiciones = None) -> np.ndarray:
+        """Posiciones (iloc) de las filas que cumplen los filtros por dimensión; el texto no se considera"""
+        resultado = None
+        for campo, bitmaps in self._bitmaps.items():
+            elegidos = getattr(filtro, campo) if filtro is not None else ()
+            if not elegidos:
+                continue
+            dimension = np.zeros((self.filas + 7) // 8, dtype=np.uint8)
+            for valor in elegidos:
+                bitmap = bitmaps.get(valor)
+                if bitmap is not None:
+                    np.bitwise_or(dimension, bitmap, out=dimension)
+            if resultado is None:
+                resultado = dimension
+            else:
+                np.bitwise_and(resultado, dimension, out=resultado)
+        if resultado is None:
+            return np.arange(self.filas)
+        return np.flatnonzero(np.unpackbits(resultado, count=self.filas).view(bool))
+
+    def filtrar(self, filtro: FiltroAdquisiciones = None) -> pd.DataFrame:
+        """
+        Adquisiciones que cumplen el filtro, con el mismo resultado que filtrar_adquisiciones_df
+
+        La búsqueda por texto, si la hay, se aplica solo sobre las filas ya elegidas.
+        """
+        df = self.df.take(self.posiciones(filtro))
+        if filtro is not None and filtro.texto:
+            return filtrar_adquisiciones_df(df, FiltroAdquisiciones(texto=filtro.texto))
+        return df.reset_index(drop=True)
@@ -0,0 +1,200 @@
+"""
+Lectura de archivos Excel por bloques
+Los motores de lectura son intercambiables: openpyxl en modo read_only (por defecto,
+la memoria usada no depende del tamaño del archivo) o calamine, bastante más rápido
+si python-calamine está instalado. El motor se elige con la variable LECTOR_EXCEL.
+"""
+import os
+from abc import ABC, abstractmethod
+from itertools import islice
+import openpyxl
+import pandas as pd
+
+try:
+    from python_calamine import CalamineWorkbook
+except ImportError:
+    CalamineWorkbook = None
+
+# Filas por bloque entregado al parser y al escritor
+TAMAÑO_BLOQUE = 10000
+
+MOTOR_POR_DEFECTO = 'openpyxl'
+
+def _rebobinar(archivo):
+    """Vuelve al inicio los archivos en memoria para poder leerlos otra vez"""
+    if hasattr(archivo, 'seek'):
+        archivo.seek(0)
+
+class LectorExcel(ABC):
+    """
+    Interfaz de un motor de lectura: recorre una hoja como tuplas de valores,
+    con None en las celdas vacías y empezando en la fila 1 de Excel
+    """
+    nombre = None
+
+    def disponible(self) -> bool:
+        return True
+
+    @abstractmethod
+    def nombres_hojas(self, archivo):
+        """Nombres de las hojas del libro, en orden"""
+
+    @abstractmethod
+    def contar_filas(self, archivo, hoja=0):
+        """Filas declaradas de la hoja o None si el archivo no lo declara"""
+
+    @abstractmethod
+    def iterar_filas(self, archivo, hoja=0, fila_inicial: int = 1):
+        """Generador de tuplas desde fila_inicial; debe cerrar el archivo al terminar"""
+
+class LectorOpenpyxl(LectorExcel):
+    nombre = 'openpyxl'
+
+    @staticmethod
+    def _hoja(libro, hoja):
+        return libro[hoja] if isinstance(hoja, str) else libro.worksheets[hoja]
+
+    def nombres_hojas(self, archivo):
+        libro = openpyxl.load_workbook(archivo, read_only=True, data_only=True)
+        try:
+            return libro.sheetnames
+        finally:
+            libro.close()
+            _rebobinar(archivo)
+
+    def contar_filas(self, archivo, hoja=0):
+        libro = openpyxl.load_workbook(archivo, read_only=True, data_only=True)
+        try:
+            return self._hoja(libro, hoja).max_row
+        finally:
+            libro.close()
+            _rebobinar(archivo)
+
+    def iterar_filas(self, archivo, hoja=0, fila_inicial: int = 1):
+        libro = openpyxl.load_workbook(archivo, read_only=True, data_only=True)
+        try:
+            yield from self._hoja(libro, hoja).iter_rows(min_row=fila_inicial, values_only=True)
+        finally:
+            libro.close()
+            _rebobinar(archivo)
+
+class LectorCalamine(LectorExcel):
+    """Motor en Rust; carga la hoja completa en memoria, pero la lee varias veces más rápido"""
+    nombre = 'calamine'
+
+    def disponible(self) -> bool:
+        return CalamineWorkbook is not None
+
+    @staticmethod
+    def _hoja(archivo, hoja):
+        libro = CalamineWorkbook.from_object(archivo)
+        if isinstance(hoja, str):
+            return libro.get_sheet_by_name(hoja)
+        return libro.get_sheet_by_index(hoja)
+
+    def nombres_hojas(self, archivo):
+        try:
+            return CalamineWorkbook.from_object(archivo).sheet_names
+        finally:
+            _rebobinar(archivo)
+
+    def contar_filas(self, archivo, hoja=0):
+        try:
+            hoja = self._hoja(archivo, hoja)
+            return hoja.start[0] + hoja.height if hoja.start else 0
+        finally:
+            _rebobinar(archivo)
+
+    def iterar_filas(self, archivo, hoja=0, fila_inicial: int = 1):
+        try:
+            hoja = self._hoja(archivo, hoja)
+            if not hoja.start:
+                return
+            # calamine recorta las filas y columnas vacías del inicio de la hoja
+            fila_origen, columna_origen = hoja.start
+            relleno = (None,) * columna_origen
+            for _ in range(min(fila_inicial - 1, fila_origen), fila_origen):
+                yield ()
+            for fila in islice(hoja.iter_rows(), max(fila_inicial - 1 - fila_origen, 0), None):
+                yield relleno + tuple(None if valor == '' else valor for valor in fila)
+        finally:
+            _rebobinar(archivo)
+
+LECTORES = {lector.nombre: lector for lector in (LectorOpenpyxl(), LectorCalamine())}
+
+def motores_disponibles():
+    """Nombres de los motores de lectura que se pueden usar en este servidor"""
+    return [nombre for nombre, lector in LECTORES.items() if lector.disponible()]
+
+def obtener_lector(motor: str = None) -> LectorExcel:
+    """
+    Retorna el motor pedido, o el configurado en LECTOR_EXCEL
+
+    Si el motor configurado no está instalado se usa openpyxl; si se pide
+    explícitamente un motor no disponible se lanza ValueError.
+    """
+    nombre = motor or os.getenv('LECTOR_EXCEL', MOTOR_POR_DEFECTO)
+    lector = LECTORES.get(nombre)
+    if lector is None:
+        raise ValueError(f"Motor de lectura desconocido: {nombre}")
+    if not lector.disponible():
+        if motor:
+            raise ValueError(f"El motor de lectura {nombre} no está instalado")
+        lector = LECTORES[MOTOR_POR_DEFECTO]
+    return lector
+
+def nombres_hojas_excel(archivo, motor: str = None):
+    """Nombres de las hojas del libro"""
+    return obtener_lector(motor).nombres_hojas(archivo)
+
+def contar_filas_excel(archivo, filas_omitidas: int = 0, hoja=0, motor: str = None):
+    """
+    Estima las filas de datos de la hoja a partir de su dimensión declarada
+
+    Returns:
+        Número de filas (sin las omitidas ni el encabezado) o None si la hoja no lo declara
+    """
+    max_fila = obtener_lector(motor).contar_filas(archivo, hoja)
+    return max(max_fila - filas_omitidas - 1, 0) if max_fila else None
+
+def iterar_bloques_excel(archivo, filas_omitidas: int = 0, tamaño_bloque: int = TAMAÑO_BLOQUE,
+                         hoja=0, motor: str = None):
+    """
+    Recorre la hoja (por defecto la primera) entregando DataFrames de a lo más tamaño_bloque filas
+
+    Equivale a pd.read_excel(archivo, skiprows=filas_omitidas) partido en bloques: la
+    fila siguiente a las omitidas es el encabezado y las filas vacías se descartan.
+    El índice de cada bloque es el número de fila en Excel, para reportar errores.
+    """
+    filas = obtener_lector(motor).iterar_filas(archivo, hoja, fila_inicial=filas_omitidas + 1)
+    try:
+        encabezado = next(filas, None)
+        if encabezado is None:
+            return
+
+        columnas = [
+            nombre if nombre is not None else f"Unnamed: {i}"
+            for i, nombre in enumerate(encabezado)
+        ]
+        ancho = len(columnas)
+        fila_excel = filas_omitidas + 2
+
+        while True:
+            bloque = [
+                fila[:ancho] + (None,) * (ancho - len(fila))
+                for fila in islice(filas, tamaño_bloque)
+            ]
+            if not bloque:
+                break
+            df = pd.DataFrame(bloque, columns=columnas, index=range(fila_excel, fila_excel + len(bloque)))
+            fila_excel += len(bloque)
+            yield df.dropna(how='all')
+    finally:
+        filas.close()
+
+def leer_hoja_excel(archivo, hoja=0, filas_omitidas: int = 0, motor: str = None) -> pd.DataFrame:
+    """Lee una hoja completa; para hojas chicas como las de la plantilla de adquisiciones"""
+    bloques = list(iterar_bloques_excel(archivo, filas_omitidas, hoja=hoja, motor=motor))
+    if not bloques:
+        return pd.DataFrame()
+    return pd.concat(bloques)
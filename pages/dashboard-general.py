@@ -16,6 +16,8 @@ from components import (
     get_global_styles,
     render_metric_inei
 )
+from datos_tablero import cargar_resumen_programacion
+import precalentamiento
 
 # ============================================================
 # CONFIGURACIÓN DE PÁGINA
@@ -111,7 +113,7 @@ render_navbar(
 )
 
 # ============================================================
-# DATOS SIMULADOS REALISTAS
+# DATOS SIMULADOS REALISTAS (solo sin programación cargada)
 # ============================================================
 @st.cache_data
 def generar_datos_simulados():
@@ -224,8 +226,18 @@ def generar_datos_simulados():
 
     return pd.DataFrame(registros)
 
-# Cargar datos simulados
-df = generar_datos_simulados()
+# Cargar el resumen de la programación importada (tabla resumen_programacion). Antes
+# esta página mostraba siempre datos simulados; ahora solo se usan mientras no haya
+# programación cargada, y se avisa en pantalla.
+# La primera visita tras un reinicio espera el precalentamiento del servidor
+if not precalentamiento.esta_listo():
+    with st.spinner("Preparando los datos del tablero..."):
+        precalentamiento.esperar()
+df = cargar_resumen_programacion()
+if df.empty:
+    df = generar_datos_simulados()
+    st.info("ℹ️ No hay programación cargada: se muestran datos simulados de ejemplo. "
+            "Importe la programación anual en la pestaña 'Importar/Exportar' del Dashboard de Adquisiciones.")
 
 # ============================================================
 # FILTROS SUPERIORES
@@ -363,7 +375,7 @@ with col_grafico:
     st.markdown('<div class="section-title">% AVANCE DE EJECUCIÓN PRESUPUESTAL POR DDNNTT</div>', unsafe_allow_html=True)
 
     # Agrupar por DDNNTT
-    df_agrupado = df_filtrado.groupby('UE').agg({
+    df_agrupado = df_filtrado.groupby('UE', observed=True).agg({
         'PIM': 'sum',
         'Certificado': 'sum',
         'Devengado': 'sum'
@@ -423,7 +435,7 @@ with col_grafico:
     st.markdown('<div class="section-title" style="margin-top: 1rem;">META PROYECTADA / EJECUCIÓN DEL MES</div>', unsafe_allow_html=True)
 
     # Crear gráfico de comparación por meta
-    df_por_meta = df_filtrado.groupby('Meta').agg({
+    df_por_meta = df_filtrado.groupby('Meta', observed=True).agg({
         'PIM': 'sum',
         'Certificado': 'sum',
         'Devengado': 'sum'
@@ -529,7 +541,7 @@ st.markdown("---")
 # Totales por DDNNTT
 st.markdown("### 📈 Resumen por Unidad Ejecutora")
 
-df_resumen = df_filtrado.groupby('UE').agg({
+df_resumen = df_filtrado.groupby('UE', observed=True).agg({
     'PIM': 'sum',
     'Certificado': 'sum',
     'PIM_Por_Certificar': 'sum',
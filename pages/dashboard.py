@@ -2,8 +2,10 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
+from dataclasses import replace
 from datetime import datetime
 import io
+import re
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.lib import colors
 from reportlab.lib.styles import getSampleStyleSheet
@@ -17,18 +19,34 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from components import init_page, render_navbar, render_footer, render_metric_inei, get_global_styles
-from database import SessionLocal, UnidadEjecutora
+from database import UnidadEjecutora
 from db_operations import (
     inicializar_datos_ejemplo,
     obtener_programacion_df,
-    obtener_adquisiciones_df,
-    obtener_detalle_adquisicion,
-    procesar_archivo_programacion,
+    FiltroAdquisiciones,
     obtener_alertas,
     crear_alerta,
     eliminar_alerta
 )
-from database import SessionLocal as DirectSessionLocal
+from datos_tablero import (
+    cargar_opciones_filtro,
+    cargar_datos_adquisiciones,
+    cargar_vista_adquisiciones,
+    cargar_detalle_adquisicion,
+    filtro_inicial,
+    TIPOS_PERMITIDOS,
+    ESTADOS_PERMITIDOS
+)
+import cache_datos
+import precalentamiento
+from trabajos_importacion import (
+    encolar_importacion_programacion,
+    encolar_importacion_adquisiciones,
+    obtener_trabajos_recientes,
+    ESTADOS_ACTIVOS,
+    ESTADO_COMPLETADO,
+    ESTADO_ERROR
+)
 
 # Inicializar página con componentes
 init_page("Dashboard de Adquisiciones", initial_sidebar_state="collapsed")
@@ -86,187 +104,197 @@ def get_chart_layout(title: str, height: int = 450) -> dict:
         }
     }
 
-@st.cache_data(ttl=60)
-def cargar_datos_adquisiciones():
-    """Carga datos de adquisiciones desde la base de datos"""
-    return obtener_adquisiciones_df()
-
-@st.dialog("Detalle de Adquisición", width="large")
-def mostrar_detalle_adquisicion(codigo_adquisicion):
-    """Modal para mostrar el detalle completo de una adquisición con timeline"""
-    db = DirectSessionLocal()
-    try:
-        detalle_completo = obtener_detalle_adquisicion(db, codigo_adquisicion)
-
-        if not detalle_completo:
-            st.error("No se encontró la adquisición")
-            return
-
-        adq = detalle_completo['adquisicion']
-        detalle = detalle_completo['detalle']
-        procesos = detalle_completo['procesos']
-
-        col1, col2 = st.columns([2, 1])
-
-        with col1:
-            st.subheader(f"{codigo_adquisicion}")
-            st.write(f"**{adq.descripcion}**")
-
-        with col2:
-            if detalle:
-                st.metric("PIM Asignado", f"S/ {detalle.pim_asignado:,.0f}")
+def _contenido_detalle_adquisicion(codigo_adquisicion):
+    """Contenido del modal de detalle de una adquisición con timeline"""
+    detalle_completo = cargar_detalle_adquisicion(codigo_adquisicion)
 
-        col_a, col_b, col_c, col_d = st.columns(4)
+    if not detalle_completo:
+        st.error("No se encontró la adquisición")
+        return
 
-        with col_a:
-            if detalle:
-                st.metric("Entregables", f"{detalle.requerimientos_adquiridos}/{detalle.requerimientos_total}")
+    adq = detalle_completo.adquisicion
+    detalle = detalle_completo.detalle
+    procesos = detalle_completo.procesos
 
-        with col_b:
-            st.metric("Estado", adq.estado)
+    col1, col2 = st.columns([2, 1])
 
-        with col_c:
-            st.metric("Monto Referencial", f"S/ {adq.monto_referencial:,.0f}")
-
-        with col_d:
-            st.metric("Monto Adjudicado", f"S/ {adq.monto_adjudicado:,.0f}")
+    with col1:
+        st.subheader(f"{codigo_adquisicion}")
+        st.write(f"**{adq.descripcion}**")
 
+    with col2:
         if detalle:
-            st.info(f"**Unidad Responsable:** {detalle.unidad_responsable} | **Tipo:** {detalle.tipo_servicio}")
+            st.metric("PIM Asignado", f"S/ {detalle.pim_asignado:,.0f}")
 
-        st.divider()
+    col_a, col_b, col_c, col_d = st.columns(4)
 
-        if procesos:
-            # Header con toggle de expandir
-            col_title, col_expand = st.columns([4, 1])
-            with col_title:
-                st.subheader("Timeline del Proceso")
-            with col_expand:
-                expand_timeline = st.toggle("Ampliar", key="toggle_expand_timeline", help="Expandir gráfico")
-
-            df_procesos = pd.DataFrame([{
-                'Orden': p.orden,
-                'Hito': p.hito,
-                'Area': p.tipo_flujo,
-                'Fecha_Inicio': p.fecha_inicio,
-                'Fecha_Fin': p.fecha_fin if p.fecha_fin else p.fecha_inicio,
-                'Dias': p.dias_transcurridos,
-                'Responsable': p.responsable_correo
-            } for p in procesos])
-
-            # Configuración según si está expandido o no
-            if expand_timeline:
-                chart_height = 650
-                title_size = 22
-                font_size = 15
-                tick_size = 14
-                axis_title_size = 16
-                legend_size = 14
-                text_size = 13
-            else:
-                chart_height = 420
-                title_size = 18
-                font_size = 13
-                tick_size = 12
-                axis_title_size = 14
-                legend_size = 12
-                text_size = 11
-
-            fig_timeline = px.timeline(
-                df_procesos,
-                x_start='Fecha_Inicio',
-                x_end='Fecha_Fin',
-                y='Hito',
-                color='Area',
-                hover_data=['Dias', 'Responsable'],
-                color_discrete_map={'OTIN': '#FFB84D', 'OTA': '#90EE90'}
-            )
+    with col_a:
+        if detalle:
+            st.metric("Entregables", f"{detalle.requerimientos_adquiridos}/{detalle.requerimientos_total}")
+
+    with col_b:
+        st.metric("Estado", adq.estado)
+
+    with col_c:
+        st.metric("Monto Referencial", f"S/ {adq.monto_referencial:,.0f}")
+
+    with col_d:
+        st.metric("Monto Adjudicado", f"S/ {adq.monto_adjudicado:,.0f}")
+
+    if detalle:
+        st.info(f"**Unidad Responsable:** {detalle.unidad_responsable} | **Tipo:** {detalle.tipo_servicio}")
+
+    st.divider()
+
+    if procesos:
+        # Header con toggle de expandir
+        col_title, col_expand = st.columns([4, 1])
+        with col_title:
+            st.subheader("Timeline del Proceso")
+        with col_expand:
+            expand_timeline = st.toggle("Ampliar", key="toggle_expand_timeline", help="Expandir gráfico")
+
+        df_procesos = pd.DataFrame([{
+            'Orden': p.orden,
+            'Hito': p.hito,
+            'Area': p.tipo_flujo,
+            'Fecha_Inicio': p.fecha_inicio,
+            'Fecha_Fin': p.fecha_fin if p.fecha_fin else p.fecha_inicio,
+            'Dias': p.dias_transcurridos,
+            'Responsable': p.responsable_correo
+        } for p in procesos])
+
+        # Configuración según si está expandido o no
+        if expand_timeline:
+            chart_height = 650
+            title_size = 22
+            font_size = 15
+            tick_size = 14
+            axis_title_size = 16
+            legend_size = 14
+            text_size = 13
+        else:
+            chart_height = 420
+            title_size = 18
+            font_size = 13
+            tick_size = 12
+            axis_title_size = 14
+            legend_size = 12
+            text_size = 11
+
+        fig_timeline = px.timeline(
+            df_procesos,
+            x_start='Fecha_Inicio',
+            x_end='Fecha_Fin',
+            y='Hito',
+            color='Area',
+            hover_data=['Dias', 'Responsable'],
+            color_discrete_map={'OTIN': '#FFB84D', 'OTA': '#90EE90'}
+        )
 
-            fig_timeline.update_layout(
-                title={
-                    'text': 'Flujo de Proceso de Adquisición',
-                    'font': {'size': title_size, 'color': '#1f2937', 'family': 'Inter, sans-serif'},
-                    'x': 0.5,
-                    'xanchor': 'center'
-                },
-                font={'size': font_size, 'family': 'Inter, sans-serif'},
-                height=chart_height,
-                margin={'t': 60, 'b': 100, 'l': 30, 'r': 30},
-                yaxis={
-                    'categoryorder': 'array',
-                    'categoryarray': df_procesos['Hito'].tolist()[::-1],
-                    'tickfont': {'size': tick_size}
-                },
-                xaxis={
-                    'title': {'text': 'Fecha', 'font': {'size': axis_title_size}},
-                    'tickfont': {'size': tick_size - 1}
-                },
-                legend={
-                    'font': {'size': legend_size},
-                    'orientation': 'h',
-                    'yanchor': 'bottom',
-                    'y': -0.18,
-                    'xanchor': 'center',
-                    'x': 0.5
-                },
-                showlegend=True
-            )
+        fig_timeline.update_layout(
+            title={
+                'text': 'Flujo de Proceso de Adquisición',
+                'font': {'size': title_size, 'color': '#1f2937', 'family': 'Inter, sans-serif'},
+                'x': 0.5,
+                'xanchor': 'center'
+            },
+            font={'size': font_size, 'family': 'Inter, sans-serif'},
+            height=chart_height,
+            margin={'t': 60, 'b': 100, 'l': 30, 'r': 30},
+            yaxis={
+                'categoryorder': 'array',
+                'categoryarray': df_procesos['Hito'].tolist()[::-1],
+                'tickfont': {'size': tick_size}
+            },
+            xaxis={
+                'title': {'text': 'Fecha', 'font': {'size': axis_title_size}},
+                'tickfont': {'size': tick_size - 1}
+            },
+            legend={
+                'font': {'size': legend_size},
+                'orientation': 'h',
+                'yanchor': 'bottom',
+                'y': -0.18,
+                'xanchor': 'center',
+                'x': 0.5
+            },
+            showlegend=True
+        )
 
-            # Actualizar tamaño de texto en las barras del timeline
-            fig_timeline.update_traces(
-                textfont_size=text_size
-            )
+        # Actualizar tamaño de texto en las barras del timeline
+        fig_timeline.update_traces(
+            textfont_size=text_size
+        )
 
-            # Configuración para la barra de herramientas de Plotly
-            modal_chart_config = {
-                'displayModeBar': True,
-                'displaylogo': False,
-                'modeBarButtonsToRemove': ['lasso2d', 'select2d'],
-                'toImageButtonOptions': {
-                    'format': 'png',
-                    'filename': 'timeline_proceso',
-                    'height': 800,
-                    'width': 1400,
-                    'scale': 2
-                }
+        # Configuración para la barra de herramientas de Plotly
+        modal_chart_config = {
+            'displayModeBar': True,
+            'displaylogo': False,
+            'modeBarButtonsToRemove': ['lasso2d', 'select2d'],
+            'toImageButtonOptions': {
+                'format': 'png',
+                'filename': 'timeline_proceso',
+                'height': 800,
+                'width': 1400,
+                'scale': 2
             }
+        }
 
-            st.plotly_chart(fig_timeline, use_container_width=True, config=modal_chart_config)
-
-            total_dias = sum(p.dias_transcurridos for p in procesos)
-            st.metric("**Total de Días del Proceso**", f"{total_dias} días")
-
-            st.divider()
-            st.subheader("Detalle de Pasos del Proceso")
-
-            df_procesos_tabla = pd.DataFrame([{
-                'Orden': p.orden,
-                'Hito': p.hito,
-                'Área': p.tipo_flujo,
-                'Días': p.dias_transcurridos,
-                'Fecha Inicio': p.fecha_inicio.strftime('%d/%m/%Y') if p.fecha_inicio else '',
-                'Responsable': p.responsable_correo if p.responsable_correo else '',
-                'Comentarios': p.comentarios if p.comentarios else ''
-            } for p in procesos])
+        st.plotly_chart(fig_timeline, use_container_width=True, config=modal_chart_config)
 
-            st.dataframe(df_procesos_tabla, use_container_width=True, hide_index=True)
+        total_dias = sum(p.dias_transcurridos for p in procesos)
+        st.metric("**Total de Días del Proceso**", f"{total_dias} días")
 
-        else:
-            st.info("No hay información de proceso disponible para esta adquisición")
+        st.divider()
+        st.subheader("Detalle de Pasos del Proceso")
 
-    finally:
-        db.close()
+        df_procesos_tabla = pd.DataFrame([{
+            'Orden': p.orden,
+            'Hito': p.hito,
+            'Área': p.tipo_flujo,
+            'Días': p.dias_transcurridos,
+            'Fecha Inicio': p.fecha_inicio.strftime('%d/%m/%Y') if p.fecha_inicio else '',
+            'Responsable': p.responsable_correo if p.responsable_correo else '',
+            'Comentarios': p.comentarios if p.comentarios else ''
+        } for p in procesos])
 
-# Cargar datos
-df_adquisiciones = cargar_datos_adquisiciones()
+        st.dataframe(df_procesos_tabla, use_container_width=True, hide_index=True)
 
-# Verificar si hay un código de adquisición en la URL (query param)
-query_params = st.query_params
-codigo_adq_url = query_params.get("adq", None)
+    else:
+        st.info("No hay información de proceso disponible para esta adquisición")
 
-# Si hay un código en la URL, mostrar el modal automáticamente
+@st.dialog("Detalle de Adquisición", width="large")
+def mostrar_detalle_adquisicion(codigo_adquisicion):
+    """Modal para mostrar el detalle completo de una adquisición con timeline"""
+    _contenido_detalle_adquisicion(codigo_adquisicion)
+
+def _cerrar_enlace_directo():
+    """Al cerrar el modal de un enlace directo se quita ?adq= y la página carga el tablero"""
+    if "adq" in st.query_params:
+        del st.query_params["adq"]
+
+@st.dialog("Detalle de Adquisición", width="large", on_dismiss=_cerrar_enlace_directo)
+def mostrar_detalle_enlace_directo(codigo_adquisicion):
+    """Modal de un enlace directo (?adq=); al cerrarlo se carga el tablero"""
+    _contenido_detalle_adquisicion(codigo_adquisicion)
+    if st.button("Ver tablero de adquisiciones", key="btn_cerrar_enlace_directo"):
+        _cerrar_enlace_directo()
+        st.rerun()
+
+# Enlace directo a una adquisición (query param): se muestra solo su detalle, leído con
+# una consulta, y el tablero completo se carga cuando el usuario cierra el modal
+codigo_adq_url = st.query_params.get("adq", None)
 if codigo_adq_url:
-    mostrar_detalle_adquisicion(codigo_adq_url)
+    precalentamiento.esperar_base_datos()
+    mostrar_detalle_enlace_directo(codigo_adq_url)
+    st.stop()
+
+# Cargar datos; la primera visita tras un reinicio espera el precalentamiento del servidor
+if not precalentamiento.esta_listo():
+    with st.spinner("Preparando los datos del tablero..."):
+        precalentamiento.esperar()
+opciones_filtro = cargar_opciones_filtro()
 
 # ============================================================
 # FILTROS EN LA PARTE SUPERIOR
@@ -279,18 +307,21 @@ ue_seleccionada = []
 tipo_servicio_seleccionado = []
 estado_seleccionado = []
 
-if len(df_adquisiciones) == 0:
+if opciones_filtro['total'] == 0:
     st.warning("⚠️ No hay datos cargados. Por favor, importe un archivo de programación en la pestaña 'Importar/Exportar'")
 else:
+    # Los valores por defecto son los de la vista que se precalienta
+    seleccion_inicial = filtro_inicial(opciones_filtro)
+
     # Contenedor de filtros usando expander de Streamlit
     with st.expander("🔍 **Filtros de Búsqueda**", expanded=True):
         # Primera fila de filtros
         col_f1, col_f2, col_f3 = st.columns([1, 2, 2])
 
         with col_f1:
-            años_disponibles = sorted(df_adquisiciones['Año'].unique())
+            años_disponibles = opciones_filtro['años']
             opciones_año = ["Todos"] + list(años_disponibles)
-            indice_default = opciones_año.index(2025) if 2025 in años_disponibles else 0
+            indice_default = opciones_año.index(seleccion_inicial.años[0]) if seleccion_inicial.años else 0
             año_seleccionado = st.selectbox(
                 "Año",
                 options=opciones_año,
@@ -299,20 +330,23 @@ else:
             )
 
         with col_f2:
-            ues_disponibles = sorted(df_adquisiciones['UE'].unique())
+            ues_disponibles = opciones_filtro['ues']
             ue_seleccionada = st.multiselect(
                 "DDNNTT (Unidad Ejecutora)",
                 options=ues_disponibles,
-                default=ues_disponibles,
+                default=seleccion_inicial.ues,
                 key="filtro_ue"
             )
 
         with col_f3:
-            metas_disponibles = sorted(df_adquisiciones['Meta'].unique())
+            # Se filtra por código de meta y se muestra su descripción
+            descripciones_meta = dict(zip(opciones_filtro['metas']['codigo'], opciones_filtro['metas']['descripcion']))
+            metas_disponibles = list(descripciones_meta)
             meta_seleccionada = st.multiselect(
                 "Meta Presupuestal",
                 options=metas_disponibles,
-                default=metas_disponibles[:5] if len(metas_disponibles) > 5 else metas_disponibles,
+                default=seleccion_inicial.metas,
+                format_func=lambda codigo: descripciones_meta.get(codigo, codigo),
                 key="filtro_meta"
             )
 
@@ -320,22 +354,18 @@ else:
         col_f4, col_f5 = st.columns(2)
 
         with col_f4:
-            tipos_permitidos = ['BIEN', 'SERVICIO']
-            tipos_en_datos = [t for t in tipos_permitidos if t in df_adquisiciones['Tipo_Servicio'].values]
             tipo_servicio_seleccionado = st.multiselect(
                 "Tipo (Bien/Servicio)",
-                options=tipos_permitidos,
-                default=tipos_en_datos,
+                options=TIPOS_PERMITIDOS,
+                default=seleccion_inicial.tipos,
                 key="filtro_tipo"
             )
 
         with col_f5:
-            estados_permitidos = ['EN PROCESO', 'CULMINADO', 'CANCELADO', 'HISTORICO', 'NO INICIADO']
-            estados_en_datos = [e for e in estados_permitidos if e in df_adquisiciones['Estado'].values]
             estado_seleccionado = st.multiselect(
                 "Estado",
-                options=estados_permitidos,
-                default=estados_en_datos,
+                options=ESTADOS_PERMITIDOS,
+                default=seleccion_inicial.estados,
                 key="filtro_estado"
             )
 
@@ -349,25 +379,25 @@ tabs = st.tabs([
 ])
 
 with tabs[0]:
-    if len(df_adquisiciones) == 0:
+    if opciones_filtro['total'] == 0:
         st.info("⚠️ No hay datos de adquisiciones disponibles")
     else:
-        df_adq_filtrado = df_adquisiciones.copy()
-
-        if año_seleccionado != "Todos":
-            df_adq_filtrado = df_adq_filtrado[df_adq_filtrado['Año'] == año_seleccionado]
-
-        if ue_seleccionada:
-            df_adq_filtrado = df_adq_filtrado[df_adq_filtrado['UE'].isin(ue_seleccionada)]
-
-        if meta_seleccionada:
-            df_adq_filtrado = df_adq_filtrado[df_adq_filtrado['Meta'].isin(meta_seleccionada)]
-
-        if tipo_servicio_seleccionado:
-            df_adq_filtrado = df_adq_filtrado[df_adq_filtrado['Tipo_Servicio'].isin(tipo_servicio_seleccionado)]
-
-        if estado_seleccionado:
-            df_adq_filtrado = df_adq_filtrado[df_adq_filtrado['Estado'].isin(estado_seleccionado)]
+        # Los filtros se resuelven en memoria con el índice de bitmaps (ver indice_filtros)
+        # sobre la tabla completa del cache del proceso; no se consulta la BD por selección
+        filtro = FiltroAdquisiciones(
+            años=() if año_seleccionado == "Todos" else (año_seleccionado,),
+            ues=ue_seleccionada,
+            metas=meta_seleccionada,
+            tipos=tipo_servicio_seleccionado,
+            estados=estado_seleccionado
+        )
+        df_adq_filtrado = cargar_datos_adquisiciones(filtro)
+        # Indicadores y agregados de los gráficos, compartidos con las sesiones que miran la misma selección
+        vista = cargar_vista_adquisiciones(filtro)
+        totales = vista.totales
+        por_estado = vista.por_estado
+        culminados = por_estado[por_estado['Estado'] == 'CULMINADO']
+        por_ue = vista.por_ue
 
         # ============================================================
         # RESUMEN EJECUTIVO
@@ -377,19 +407,19 @@ with tabs[0]:
         col1, col2, col3, col4, col5 = st.columns(5)
 
         with col1:
-            total_adquisiciones = len(df_adq_filtrado)
+            total_adquisiciones = totales['Cantidad']
             render_metric_inei("Total<br>Requerimientos", f"{total_adquisiciones:,}")
 
         with col2:
-            total_culminados = len(df_adq_filtrado[df_adq_filtrado['Estado'] == 'CULMINADO'])
+            total_culminados = int(culminados['Cantidad'].sum())
             render_metric_inei("Total Adquiridos<br>(Culminados)", f"{total_culminados:,}")
 
         with col3:
-            total_referencial = df_adq_filtrado['Monto_Referencial'].sum()
+            total_referencial = totales['Monto_Referencial']
             render_metric_inei("Monto Total<br>(PIM)", f"S/ {total_referencial:,.2f}")
 
         with col4:
-            monto_culminados = df_adq_filtrado[df_adq_filtrado['Estado'] == 'CULMINADO']['Monto_Adjudicado'].sum()
+            monto_culminados = culminados['Monto_Adjudicado'].sum()
             render_metric_inei("Monto Adquiridos<br>(Culminados)", f"S/ {monto_culminados:,.2f}")
 
         with col5:
@@ -405,7 +435,7 @@ with tabs[0]:
 
         with col1:
             # Gráfico de Distribución por Estado
-            adq_por_estado = df_adq_filtrado.groupby('Estado').size().reset_index(name='Cantidad')
+            adq_por_estado = por_estado[['Estado', 'Cantidad']]
 
             fig_estado = px.pie(
                 adq_por_estado,
@@ -440,10 +470,7 @@ with tabs[0]:
 
         with col2:
             # Gráfico de Montos por DDNNTT
-            montos_por_ue = df_adq_filtrado.groupby('UE').agg({
-                'Monto_Referencial': 'sum',
-                'Monto_Adjudicado': 'sum'
-            }).reset_index()
+            montos_por_ue = por_ue[['UE', 'Monto_Referencial', 'Monto_Adjudicado']]
 
             fig_montos = go.Figure()
 
@@ -510,14 +537,9 @@ with tabs[0]:
                 9: 'Septiembre', 10: 'Octubre', 11: 'Noviembre', 12: 'Diciembre'
             }
 
-            df_con_fecha = df_adq_filtrado[df_adq_filtrado['Fecha_Adjudicacion'].notna()].copy()
-
-            if len(df_con_fecha) > 0:
-                df_con_fecha['Mes'] = pd.to_datetime(df_con_fecha['Fecha_Adjudicacion']).dt.month
-                df_con_fecha['Mes_Nombre'] = df_con_fecha['Mes'].map(meses_español)
-
-                gastos_por_mes = df_con_fecha.groupby(['Mes', 'Mes_Nombre'])['Monto_Adjudicado'].sum().reset_index()
-                gastos_por_mes = gastos_por_mes.sort_values('Mes')
+            if len(vista.por_mes) > 0:
+                gastos_por_mes = vista.por_mes.copy()
+                gastos_por_mes['Mes_Nombre'] = gastos_por_mes['Mes'].map(meses_español)
 
                 fig_meses = px.bar(
                     gastos_por_mes,
@@ -557,10 +579,7 @@ with tabs[0]:
 
         with col4:
             # Gráfico de % Avance por DDNNTT
-            avance_por_ue = df_adq_filtrado.groupby('UE').agg({
-                'Monto_Referencial': 'sum',
-                'Monto_Adjudicado': 'sum'
-            }).reset_index()
+            avance_por_ue = por_ue[['UE', 'Monto_Referencial', 'Monto_Adjudicado']].copy()
             avance_por_ue['Avance_%'] = (avance_por_ue['Monto_Adjudicado'] / avance_por_ue['Monto_Referencial'] * 100).round(1)
             avance_por_ue = avance_por_ue.sort_values('Avance_%', ascending=True)
 
@@ -624,17 +643,15 @@ with tabs[0]:
                 placeholder="Seleccionar adquisiciones..."
             )
 
-        df_adq_tabla = df_adq_filtrado.copy()
+        # La búsqueda por texto se aplica en memoria solo sobre las filas que eligió el índice
+        if busqueda_adq.strip():
+            df_adq_tabla = cargar_datos_adquisiciones(replace(filtro, texto=busqueda_adq))
+        else:
+            df_adq_tabla = df_adq_filtrado.copy()
 
         if adquisiciones_seleccionadas:
             df_adq_tabla = df_adq_tabla[df_adq_tabla['Descripción'].isin(adquisiciones_seleccionadas)]
 
-        if busqueda_adq:
-            df_adq_tabla = df_adq_tabla[
-                df_adq_tabla['Descripción'].str.contains(busqueda_adq, case=False, na=False) |
-                df_adq_tabla['Proveedor'].str.contains(busqueda_adq, case=False, na=False)
-            ]
-
         df_adq_display = df_adq_tabla[['Año', 'UE', 'Meta', 'Código', 'Descripción', 'Tipo_Servicio', 'Cantidad','Tipo_Proceso', 'Estado', 'Monto_Referencial', 'Monto_Adjudicado', 'Proveedor', 'Avance_%']].copy()
         df_adq_display['Monto_Referencial'] = df_adq_display['Monto_Referencial'].apply(lambda x: f"S/ {x:,.0f}")
         df_adq_display['Monto_Adjudicado'] = df_adq_display['Monto_Adjudicado'].apply(lambda x: f"S/ {x:,.0f}")
@@ -654,7 +671,7 @@ with tabs[0]:
             codigo_seleccionado_tabla = df_adq_display.iloc[fila_seleccionada]['Código']
             mostrar_detalle_adquisicion(codigo_seleccionado_tabla)
 
-        st.caption(f"Mostrando {len(df_adq_tabla)} de {len(df_adquisiciones)} adquisiciones totales")
+        st.caption(f"Mostrando {len(df_adq_tabla)} de {opciones_filtro['total']} adquisiciones totales")
 
 # ============================================================
 # TAB IMPORTAR/EXPORTAR
@@ -678,31 +695,106 @@ with tabs[1]:
         st.info("""
         **Formato requerido:**
 
-        - Archivo Excel (.xlsx) con estructura de Programación Anual
+        - Uno o varios archivos Excel (.xlsx) con estructura de Programación Anual
         - Columnas: PIM, CERTIFICADO, PIM POR CERTIFICAR, TOTAL ANUAL, etc.
         - El archivo debe incluir las Unidades Ejecutoras y Metas
+        - Si el año ya fue importado, solo se actualizan las filas que cambiaron
         """)
 
-        archivo_carga = st.file_uploader(
-            "Cargar archivo Excel de Programación Anual",
+        archivos_carga = st.file_uploader(
+            "Cargar archivos Excel de Programación Anual",
             type=['xlsx'],
+            accept_multiple_files=True,
             key="file_uploader"
         )
 
-        if archivo_carga and st.button("Importar Datos"):
-            with st.spinner("Procesando archivo..."):
-                db = SessionLocal()
-                try:
-                    exito, mensaje = procesar_archivo_programacion(db, archivo_carga, año_importacion)
-
-                    if exito:
-                        st.success(f"✅ {mensaje}")
-                        st.cache_data.clear()
-                        st.rerun()
-                    else:
-                        st.error(f"❌ {mensaje}")
-                finally:
-                    db.close()
+        if archivos_carga:
+            # El año se toma del nombre del archivo cuando lo incluye (ej. programacion_2024.xlsx)
+            años_archivos = st.data_editor(
+                pd.DataFrame({
+                    'Archivo': [a.name for a in archivos_carga],
+                    'Año': [
+                        int(m.group(1)) if (m := re.search(r'(?<!\d)(20\d{2})(?!\d)', a.name)) else año_importacion
+                        for a in archivos_carga
+                    ]
+                }),
+                column_config={
+                    'Archivo': st.column_config.TextColumn('Archivo', disabled=True),
+                    'Año': st.column_config.NumberColumn('Año', min_value=2020, max_value=2030, step=1)
+                },
+                hide_index=True,
+                use_container_width=True,
+                key="años_archivos"
+            )
+
+        if archivos_carga and st.button("Importar Datos"):
+            trabajo_id = encolar_importacion_programacion([
+                (archivo.name, archivo.getvalue(), int(año))
+                for archivo, año in zip(archivos_carga, años_archivos['Año'])
+            ])
+            st.success(f"✅ Importación encolada (trabajo #{trabajo_id}). Puede seguir usando el tablero.")
+
+        st.subheader("Importar Plantilla de Adquisiciones")
+
+        st.info("""
+        **Formato requerido:**
+
+        - Archivo generado con crear_plantilla_adquisiciones.py (Plantilla_Adquisiciones.xlsx)
+        - Se leen las hojas Adquisiciones, Detalle_Adquisicion y Proceso_Timeline
+        - Estado, Tipo_Servicio y Tipo_Flujo deben respetar la hoja Valores_Permitidos
+        - Las adquisiciones con un Código ya registrado se reemplazan
+        """)
+
+        plantilla_carga = st.file_uploader(
+            "Cargar Plantilla de Adquisiciones",
+            type=['xlsx'],
+            key="plantilla_uploader"
+        )
+
+        if plantilla_carga and st.button("Importar Adquisiciones"):
+            trabajo_id = encolar_importacion_adquisiciones(plantilla_carga.name, plantilla_carga.getvalue())
+            st.success(f"✅ Importación encolada (trabajo #{trabajo_id}). Puede seguir usando el tablero.")
+
+        # Solo se consulta cada 3 s mientras hay trabajos pendientes o en proceso (de esta
+        # u otra sesión); si no, la lista se muestra una vez por ejecución de la página
+        seguir_trabajos = any(t.estado in ESTADOS_ACTIVOS for t in obtener_trabajos_recientes())
+
+        @st.fragment(run_every=3 if seguir_trabajos else None)
+        def mostrar_trabajos_importacion():
+            """Muestra el avance de los últimos trabajos de importación"""
+            trabajos = obtener_trabajos_recientes()
+
+            # Al terminar un trabajo se releen las versiones de datos (solo se descarta el
+            # conjunto que la importación modificó) y se recarga la página
+            completados = {t.id for t in trabajos if t.estado == ESTADO_COMPLETADO}
+            vistos = st.session_state.setdefault("trabajos_completados_vistos", completados)
+            if completados - vistos:
+                st.session_state["trabajos_completados_vistos"] = vistos | completados
+                cache_datos.refrescar_versiones()
+                st.rerun()
+
+            # Terminaron los trabajos seguidos (p. ej. con error): se recarga la página para
+            # dejar de consultar
+            if seguir_trabajos and not any(t.estado in ESTADOS_ACTIVOS for t in trabajos):
+                st.rerun()
+
+            if not trabajos:
+                return
+
+            st.markdown("**Importaciones recientes**")
+            for t in trabajos:
+                etiqueta = f"#{t.id} · {t.archivo} · {t.año or 'varios años'} · {t.estado}"
+                mensaje = (t.mensaje or '').replace('\n', '  \n')
+                if t.estado in ESTADOS_ACTIVOS:
+                    avance = (t.filas_procesadas / t.filas_totales) if t.filas_totales else 0
+                    st.progress(min(avance, 1.0), text=etiqueta)
+                    st.caption(f"{t.filas_procesadas:,} de {t.filas_totales:,} filas · {t.filas_por_segundo:,.0f} filas/s")
+                elif t.estado == ESTADO_ERROR:
+                    st.error(f"{etiqueta}: {mensaje}")
+                else:
+                    st.success(f"{etiqueta}: {mensaje}")
+
+        mostrar_trabajos_importacion()
 
     with col2:
         st.subheader("Exportar Reportes")
@@ -713,6 +805,9 @@ with tabs[1]:
         )
 
         if st.button("Generar Reporte"):
+            # El reporte incluye todas las adquisiciones; se cargan solo al generarlo
+            df_adquisiciones = cargar_datos_adquisiciones(FiltroAdquisiciones())
+
             if formato_exportacion == "Excel":
                 output = io.BytesIO()
                 with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
@@ -768,5 +863,23 @@ with tabs[1]:
                     mime="application/pdf"
                 )
 
+        with st.expander("📊 Cache de datos del servidor"):
+            # Contadores del proceso desde que arrancó, compartidos por todas las sesiones
+            estadisticas = cache_datos.estadisticas()
+            c1, c2, c3 = st.columns(3)
+            c1.metric("Entradas", f"{estadisticas['entradas']:,}")
+            c2.metric("Memoria", f"{estadisticas['bytes'] / 2 ** 20:,.1f} MB")
+            c3.metric("Espera máxima", f"{estadisticas['max_segundos_espera']:.2f} s")
+            c1.metric("Aciertos", f"{estadisticas['aciertos']:,}")
+            c2.metric("Fallos", f"{estadisticas['fallos']:,}")
+            c3.metric("Vencidos", f"{estadisticas['vencidos']:,}")
+
+            por_tipo = pd.DataFrame.from_dict(estadisticas['por_tipo'], orient='index', columns=['aciertos', 'fallos'])
+            if len(por_tipo) > 0:
+                por_tipo['% aciertos'] = (por_tipo['aciertos'] / por_tipo.sum(axis=1) * 100).round(1)
+                st.dataframe(por_tipo.rename_axis('Tipo').sort_index(), use_container_width=True)
+            if estadisticas['errores_revalidacion']:
+                st.warning(f"{estadisticas['errores_revalidacion']} recálculos en segundo plano fallaron (ver el log)")
+
 # Footer
 render_footer()
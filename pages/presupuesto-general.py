@@ -12,6 +12,10 @@ from components import (
     get_global_styles,
     get_powerbi_styles
 )
+import precalentamiento
+
+# Los tableros se precalientan en segundo plano mientras se muestra esta página
+precalentamiento.iniciar()
 
 # Inicializar página
 init_page("Presupuesto General", initial_sidebar_state="collapsed")
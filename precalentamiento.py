@@ -0,0 +1,153 @@
+"""
+Precalentamiento del servidor
+Al arrancar el proceso, un hilo abre las conexiones del pool, carga los conjuntos de
+programación y adquisiciones en el cache del proceso, arma el cubo y los resúmenes de
+la vista inicial y construye una vez cada tipo de gráfico (plotly carga sus
+validadores la primera vez que se usan). Recién entonces marca la aplicación como
+lista; el tiempo de cada paso y el total se registran en el log. Después el mismo hilo
+registra cada tanto los contadores del cache del proceso (ver cache_datos.estadisticas).
+
+Streamlit no ejecuta código hasta la primera sesión, así que iniciar() se llama al
+comienzo de cada página; solo la primera llamada del proceso lanza el hilo.
+"""
+import logging
+import os
+import threading
+import time
+from database import engine
+import datos_tablero
+import cache_datos
+
+logger = logging.getLogger(__name__)
+
+# Segundos entre dos registros de los contadores del cache en el log (0 = solo al terminar)
+INTERVALO_ESTADISTICAS = float(os.getenv('CACHE_DATOS_LOG_SEGUNDOS', '600'))
+
+_lock = threading.Lock()
+_hilo = None
+_base_lista = threading.Event()
+_listo = threading.Event()
+duraciones = {}  # paso -> segundos del último precalentamiento
+
+def _abrir_pool():
+    """Abre tantas conexiones como el tamaño del pool y las devuelve, quedan ociosas para las sesiones"""
+    conexiones = []
+    try:
+        for _ in range(getattr(engine.pool, 'size', lambda: 1)()):
+            conexiones.append(engine.connect())
+    finally:
+        for conexion in conexiones:
+            conexion.close()
+
+def _precalentar_adquisiciones():
+    opciones = datos_tablero.cargar_opciones_filtro()
+    if opciones['total'] == 0:
+        return None
+    filtro = datos_tablero.filtro_inicial(opciones)
+    cache_datos.adquisiciones.obtener()
+    datos_tablero.cargar_datos_adquisiciones(filtro)
+    vista = datos_tablero.cargar_vista_adquisiciones(filtro)
+    return vista.por_estado, vista.por_ue
+
+def _precalentar_graficos(por_estado, por_ue):
+    """Construye los tipos de gráfico de los tableros para que plotly cargue sus validadores"""
+    import plotly.express as px
+    import plotly.graph_objects as go
+
+    px.pie(por_estado, values='Cantidad', names='Estado').to_dict()
+    px.bar(por_ue, x='UE', y='Cantidad').to_dict()
+    figura = go.Figure()
+    figura.add_trace(go.Bar(x=por_ue['UE'], y=por_ue['Monto_Referencial'], orientation='v'))
+    figura.add_trace(go.Scatter(x=por_ue['UE'], y=por_ue['Monto_Adjudicado']))
+    figura.to_dict()
+
+def precalentar():
+    """
+    Ejecuta los pasos del precalentamiento en orden y registra su duración
+
+    Un paso que falla se registra y no impide los siguientes: las páginas volverán a
+    intentar esa carga en la primera visita.
+    """
+    inicio = time.perf_counter()
+    resultados = {}
+
+    def graficos():
+        if resultados.get('adquisiciones') is not None:
+            _precalentar_graficos(*resultados['adquisiciones'])
+
+    pasos = [
+        ('base de datos', datos_tablero.inicializar_base_datos),
+        ('pool de conexiones', _abrir_pool),
+        ('programación', datos_tablero.cargar_resumen_programacion),
+        ('adquisiciones', _precalentar_adquisiciones),
+        ('gráficos', graficos),
+    ]
+    for nombre, paso in pasos:
+        inicio_paso = time.perf_counter()
+        try:
+            resultados[nombre] = paso()
+        except Exception:
+            logger.exception("Precalentamiento: falló el paso '%s'", nombre)
+        duraciones[nombre] = time.perf_counter() - inicio_paso
+        if nombre == 'base de datos':
+            _base_lista.set()
+        logger.info("Precalentamiento: %s en %.2f s", nombre, duraciones[nombre])
+    duraciones['total'] = time.perf_counter() - inicio
+    logger.info("Precalentamiento terminado: arranque en frío de %.2f s", duraciones['total'])
+
+def registrar_estadisticas():
+    """Registra en el log los contadores del cache y la proporción de aciertos por tipo de clave"""
+    e = cache_datos.estadisticas()
+    por_tipo = ", ".join(
+        f"{tipo} {c['aciertos'] / (c['aciertos'] + c['fallos']):.0%} de {c['aciertos'] + c['fallos']}"
+        for tipo, c in sorted(e['por_tipo'].items()) if c['aciertos'] + c['fallos']
+    )
+    logger.info(
+        "Cache de datos: %d entradas, %.1f MB; %d aciertos, %d fallos, %d vencidos, %d esperas "
+        "(máx %.2f s), %d errores de revalidación; aciertos por tipo: %s",
+        e['entradas'], e['bytes'] / 2 ** 20, e['aciertos'], e['fallos'], e['vencidos'], e['esperas'],
+        e['max_segundos_espera'], e['errores_revalidacion'], por_tipo or 'sin pedidos'
+    )
+
+def _ejecutar():
+    try:
+        precalentar()
+    finally:
+        _base_lista.set()
+        _listo.set()
+    registrar_estadisticas()
+    while INTERVALO_ESTADISTICAS > 0:
+        time.sleep(INTERVALO_ESTADISTICAS)
+        registrar_estadisticas()
+
+def iniciar():
+    """Lanza el precalentamiento en un hilo la primera vez que se llama en el proceso"""
+    global _hilo
+    with _lock:
+        if _hilo is None:
+            # Sin configuración de logging propia de la aplicación, los tiempos van a la consola
+            if not logging.getLogger().handlers:
+                logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+            _hilo = threading.Thread(target=_ejecutar, name='precalentamiento', daemon=True)
+            _hilo.start()
+
+def esta_listo() -> bool:
+    return _listo.is_set()
+
+def esperar_base_datos(timeout: float = None) -> bool:
+    """
+    Espera solo el primer paso (tablas y columnas creadas), sin las cargas de datos;
+    lo usan las consultas puntuales como el detalle de un enlace directo
+    """
+    iniciar()
+    return _base_lista.wait(timeout)
+
+def esperar(timeout: float = None) -> bool:
+    """
+    Espera a que termine el precalentamiento (lo inicia si hace falta)
+
+    Returns:
+        True si terminó, False si se cumplió el timeout
+    """
+    iniciar()
+    return _listo.wait(timeout)
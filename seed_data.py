@@ -2,6 +2,7 @@ import random
 from datetime import datetime, timedelta
 from database import SessionLocal, Base, engine, UnidadEjecutora, MetaPresupuestal, ProgramacionPresupuestal, Adquisicion, AdquisicionDetalle, AdquisicionProceso
 from sqlalchemy import text
+from db_operations import reconstruir_resumenes
 
 def crear_tablas():
     """Crea todas las tablas"""
@@ -27,6 +28,14 @@ def limpiar_base_datos():
             conn.execute(text("DELETE FROM programacion_presupuestal"))
         except:
             pass
+        try:
+            conn.execute(text("DELETE FROM resumen_adquisiciones"))
+        except:
+            pass
+        try:
+            conn.execute(text("DELETE FROM resumen_programacion"))
+        except:
+            pass
         try:
             conn.execute(text("DELETE FROM alertas"))
         except:
@@ -376,6 +385,9 @@ def main():
         detalles_2024, procesos_2024 = generar_detalles_y_procesos_adquisiciones(db, 2024)
         detalles_2025, procesos_2025 = generar_detalles_y_procesos_adquisiciones(db, 2025)
         
+        reconstruir_resumenes(db)
+        print("✅ Tablas de resumen reconstruidas")
+        
         total_prog = total_prog_2024 + total_prog_2025
         total_adq = total_adq_2024 + total_adq_2025
         total_detalles = detalles_2024 + detalles_2025
@@ -0,0 +1,211 @@
+"""
+Cola de trabajos de importación en segundo plano
+Los archivos se encolan y se procesan en un pool de hilos del servidor; el avance
+y el resultado de cada trabajo quedan registrados en la tabla trabajos_importacion
+
+Varios procesos del servidor pueden compartir la base: cada uno renueva el latido de
+los trabajos que tiene encolados o en curso, y un trabajo activo sin latido reciente
+es de un proceso que se detuvo.
+"""
+import io
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import update, func
+from database import SessionLocal, TrabajoImportacion
+from db_operations import procesar_archivos_programacion, procesar_archivo_adquisiciones
+
+ESTADO_PENDIENTE = 'PENDIENTE'
+ESTADO_EN_PROCESO = 'EN PROCESO'
+ESTADO_COMPLETADO = 'COMPLETADO'
+ESTADO_ERROR = 'ERROR'
+
+ESTADOS_ACTIVOS = (ESTADO_PENDIENTE, ESTADO_EN_PROCESO)
+
+# Pool compartido por todas las sesiones de Streamlit del proceso
+_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv('IMPORTACION_WORKERS', '2')),
+    thread_name_prefix='importacion'
+)
+
+# Segundos entre latidos; un trabajo activo sin latido en LATIDOS_PERDIDOS intervalos se da por interrumpido
+LATIDO_SEGUNDOS = float(os.getenv('IMPORTACION_LATIDO', '30'))
+LATIDOS_PERDIDOS = 4
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_activos = set()  # ids de los trabajos encolados o en curso en este proceso
+_hilo_latidos = None
+
+def _actualizar_trabajo(trabajo_id: int, **campos):
+    """Actualiza los campos de un trabajo en una sesión propia"""
+    db = SessionLocal()
+    try:
+        db.execute(update(TrabajoImportacion).where(TrabajoImportacion.id == trabajo_id).values(**campos))
+        db.commit()
+    finally:
+        db.close()
+
+def _crear_trabajo(tipo: str, archivo: str, año: int = None) -> int:
+    """Registra un trabajo pendiente y retorna su id"""
+    db = SessionLocal()
+    try:
+        trabajo = TrabajoImportacion(tipo=tipo, archivo=archivo, año=año, estado=ESTADO_PENDIENTE,
+                                     latido_at=datetime.utcnow())
+        db.add(trabajo)
+        db.commit()
+        with _lock:
+            _activos.add(trabajo.id)
+        iniciar_latidos()
+        return trabajo.id
+    finally:
+        db.close()
+
+def _ejecutar_trabajo(trabajo_id: int, importar):
+    """
+    Ejecuta una importación registrando avance y resultado
+
+    Args:
+        trabajo_id: Id del trabajo
+        importar: Función importar(db, progreso) que retorna (éxito, mensaje)
+    """
+    try:
+        _importar_registrando(trabajo_id, importar)
+    finally:
+        # Sin latido, si el trabajo quedó activo otro proceso lo dará por interrumpido
+        with _lock:
+            _activos.discard(trabajo_id)
+
+def _importar_registrando(trabajo_id: int, importar):
+    inicio = time.monotonic()
+    _actualizar_trabajo(trabajo_id, estado=ESTADO_EN_PROCESO, iniciado_at=datetime.utcnow())
+
+    def progreso(filas_procesadas: int, filas_totales: int):
+        transcurrido = max(time.monotonic() - inicio, 1e-6)
+        try:
+            _actualizar_trabajo(
+                trabajo_id,
+                filas_procesadas=filas_procesadas,
+                filas_totales=filas_totales,
+                filas_por_segundo=filas_procesadas / transcurrido
+            )
+        except Exception:
+            # El avance es informativo; no debe abortar la importación
+            pass
+
+    db = SessionLocal()
+    try:
+        exito, mensaje = importar(db, progreso)
+    except Exception as e:
+        exito, mensaje = False, f"Error al procesar archivo: {str(e)}"
+    finally:
+        db.close()
+
+    _actualizar_trabajo(
+        trabajo_id,
+        estado=ESTADO_COMPLETADO if exito else ESTADO_ERROR,
+        mensaje=mensaje,
+        finalizado_at=datetime.utcnow()
+    )
+
+def encolar_importacion_programacion(archivos) -> int:
+    """
+    Encola la importación de uno o varios archivos de programación anual y retorna de inmediato
+
+    Args:
+        archivos: Lista de tuplas (nombre, contenido: bytes, año); se reciben los bytes
+                  porque el archivo subido no sobrevive al rerun
+
+    Returns:
+        Id del trabajo creado
+    """
+    años = {año for _, _, año in archivos}
+    trabajo_id = _crear_trabajo(
+        'programacion',
+        ", ".join(nombre for nombre, _, _ in archivos),
+        años.pop() if len(años) == 1 else None
+    )
+
+    def importar(db, progreso):
+        return procesar_archivos_programacion(db, archivos, progreso=progreso)
+
+    _pool.submit(_ejecutar_trabajo, trabajo_id, importar)
+    return trabajo_id
+
+def encolar_importacion_adquisiciones(nombre: str, contenido: bytes) -> int:
+    """
+    Encola la importación de una plantilla de adquisiciones y retorna de inmediato
+
+    Returns:
+        Id del trabajo creado
+    """
+    trabajo_id = _crear_trabajo('adquisiciones', nombre)
+
+    def importar(db, progreso):
+        return procesar_archivo_adquisiciones(db, io.BytesIO(contenido), progreso=progreso)
+
+    _pool.submit(_ejecutar_trabajo, trabajo_id, importar)
+    return trabajo_id
+
+def obtener_trabajos_recientes(limite: int = 10):
+    """Obtiene los últimos trabajos de importación, del más reciente al más antiguo"""
+    db = SessionLocal()
+    try:
+        return db.query(TrabajoImportacion).order_by(TrabajoImportacion.id.desc()).limit(limite).all()
+    finally:
+        db.close()
+
+def marcar_trabajos_interrumpidos():
+    """
+    Marca como error los trabajos activos cuyo proceso se detuvo: los que no renovaron
+    su latido en LATIDOS_PERDIDOS intervalos (los de otros procesos vivos no se tocan)
+    """
+    limite = datetime.utcnow() - timedelta(seconds=LATIDO_SEGUNDOS * LATIDOS_PERDIDOS)
+    db = SessionLocal()
+    try:
+        db.execute(
+            update(TrabajoImportacion)
+            .where(
+                TrabajoImportacion.estado.in_(ESTADOS_ACTIVOS),
+                func.coalesce(TrabajoImportacion.latido_at, TrabajoImportacion.created_at) < limite
+            )
+            .values(estado=ESTADO_ERROR, mensaje="Trabajo interrumpido por reinicio del servidor",
+                    finalizado_at=datetime.utcnow())
+        )
+        db.commit()
+    finally:
+        db.close()
+
+def _latir():
+    """Renueva el latido de los trabajos de este proceso y vence los de procesos detenidos"""
+    while True:
+        time.sleep(LATIDO_SEGUNDOS)
+        try:
+            with _lock:
+                activos = list(_activos)
+            if activos:
+                db = SessionLocal()
+                try:
+                    db.execute(
+                        update(TrabajoImportacion)
+                        .where(TrabajoImportacion.id.in_(activos))
+                        .values(latido_at=datetime.utcnow())
+                    )
+                    db.commit()
+                finally:
+                    db.close()
+            marcar_trabajos_interrumpidos()
+        except Exception:
+            logger.exception("No se pudo renovar el latido de los trabajos de importación")
+
+def iniciar_latidos():
+    """Lanza el hilo de latidos la primera vez que se llama en el proceso"""
+    global _hilo_latidos
+    with _lock:
+        if _hilo_latidos is None:
+            _hilo_latidos = threading.Thread(target=_latir, name='latidos_importacion', daemon=True)
+            _hilo_latidos.start()